@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# ASGI 入口：/chat 的流式输出在事件循环上用异步客户端转发，少量进程即可承载大量并发的 token 流，
+# 其他路由仍交给 Flask 处理，响应格式与 app.py 保持一致
+# 启动：uvicorn asgi:application --host 127.0.0.1 --port 5000
+import json
+import time
+import asyncio
+from asgiref.wsgi import WsgiToAsgi
+from app import (
+    app, clients, DEEPSEEK_MODEL,
+    start_chat, user_message_saved, build_chat_prompt, chat_request_messages, save_assistant_reply, title_queue,
+    generation_cache, generation_cache_key, instrumentation_hub
+)
+from instrumentation import stage, mark, record_stream_rate
+from gen_cache import ReplayStream
+from chat_stream import create_chat_output, requested_format
+from llm_client import UpstreamBusyError
+
+flask_application = WsgiToAsgi(app)
+
+
+def in_app_context(func, *args):
+    with app.app_context():
+        return func(*args)
+
+
+async def run_db(func, *args):
+    # 数据库操作都很短，放到线程池里执行，不阻塞事件循环
+    return await asyncio.to_thread(in_app_context, func, *args)
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def cors_headers(scope):
+    # 与 flask_cors 的 supports_credentials=True 行为一致
+    headers = dict(scope.get('headers') or [])
+    origin = headers.get(b'origin')
+    if not origin:
+        return []
+    return [
+        (b'access-control-allow-origin', origin),
+        (b'access-control-allow-credentials', b'true'),
+        (b'vary', b'Origin'),
+    ]
+
+
+async def send_json(scope, send, status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())] + cors_headers(scope),
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def chat(scope, receive, send):
+    # 埋点与 Flask 路由一致；事件循环线程上同时处理多个请求，不做栈采样
+    trace, token = instrumentation_hub.begin('chat', 'POST', profile=False)
+    status = [500]
+
+    async def tracked_send(message):
+        if message['type'] == 'http.response.start':
+            status[0] = message['status']
+        await send(message)
+
+    try:
+        await stream_chat(scope, receive, tracked_send)
+    finally:
+        instrumentation_hub.finish(trace, token, status[0])
+
+
+async def stream_chat(scope, receive, send):
+    try:
+        data = json.loads(await read_body(receive) or b'{}')
+    except ValueError:
+        return await send_json(scope, send, 400, {"status": "error", "message": "请求格式错误"})
+
+    message_content = data.get('message')
+    user_id = data.get('user_id')
+    if not user_id:
+        return await send_json(scope, send, 400, {"status": "error", "message": "缺少用户ID"})
+
+    with stage('chat_setup'):
+        conversation_id, error, saved = await run_db(start_chat, user_id, data.get('conversation_id'), message_content)
+    if error:
+        return await send_json(scope, send, 400, {"status": "error", "message": error})
+
+    key = generation_cache_key(data.get('option'), message_content)
+    # 磁盘缓存是 sqlite 查询，同样放到线程池
+    cached = await asyncio.to_thread(generation_cache.get, key) if key else None
+    stream = None
+    if cached is None:
+        try:
+            # 与同步路径共用上游并发名额，名额一直占用到流被读完或关闭
+            stream = await clients.async_stream_chat_completion(
+                model=DEEPSEEK_MODEL,
+                messages=chat_request_messages(build_chat_prompt(data.get('option'), message_content))
+            )
+        except UpstreamBusyError:
+            return await send_json(scope, send, 503, {"status": "error", "message": "服务繁忙，请稍后再试"})
+        except Exception as e:
+            print(f"调用大模型失败：{str(e)}")
+            return await send_json(scope, send, 500, {"status": "error", "message": "调用大模型失败"})
+    try:
+        await relay_chat(scope, receive, send, data, user_id, conversation_id, saved, key, cached, stream)
+    finally:
+        # 客户端断开、出错或正常结束都要关闭上游流并归还并发名额
+        if stream is not None:
+            await stream.close()
+
+
+async def wait_for_disconnect(receive):
+    # 请求体读完后 receive 只会再收到 http.disconnect
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def relay_chat(scope, receive, send, data, user_id, conversation_id, saved, key, cached, stream):
+    # 用户消息的提交与建立上游连接并行，开始输出前确认已落盘
+    if not await asyncio.to_thread(user_message_saved, saved):
+        return await send_json(scope, send, 500, {"status": "error", "message": "保存消息失败，请稍后重试"})
+
+    accept = dict(scope['headers']).get(b'accept', b'').decode('latin-1')
+    output = create_chat_output(requested_format(data, accept), bool(data.get('strip_think')))
+    headers = [(b'content-type', f'{output.content_type}; charset=utf-8'.encode())]
+    headers += [(name.lower().encode(), value.encode()) for name, value in output.headers.items()]
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': headers + cors_headers(scope),
+    })
+    accumulated = []
+    first_at = []
+
+    async def emit(content):
+        if not first_at:
+            first_at.append(time.perf_counter())
+            mark('first_token')
+        accumulated.append(content)
+        content = output.feed(content)
+        if content:
+            await send({'type': 'http.response.body', 'body': content.encode('utf-8'), 'more_body': True})
+
+    async def pump():
+        if cached is not None:
+            # 命中缓存，按同样的分块方式回放
+            for content in ReplayStream(cached):
+                await emit(content)
+        else:
+            async for chunk in stream:
+                content = chunk.choices[0].delta.content
+                if content is not None:
+                    await emit(content)
+
+    # 转发与断开检测同时进行，客户端先断开时停止转发，不再等上游把回复生成完
+    relay = asyncio.ensure_future(pump())
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await asyncio.wait({relay, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+    client_gone = not relay.done()
+    error = None
+    if client_gone:
+        relay.cancel()
+    try:
+        await relay
+    except asyncio.CancelledError:
+        if not client_gone:
+            raise
+    except Exception as e:
+        error = e
+        print(f"转发大模型回复失败：{str(e)}")
+    completed = not client_gone and error is None
+    record_stream_rate(len(accumulated), first_at[0] if first_at else 0, time.perf_counter(),
+                       'cache' if cached is not None else 'llm')
+
+    # 完整读完的回复才写入缓存；中途断开或出错时已经生成的部分也保存，与提问对应
+    if completed and key and cached is None:
+        await asyncio.to_thread(generation_cache.set, key, ''.join(accumulated))
+    if completed or accumulated:
+        # 先保存回复再结束流，done 事件发出时消息已经入库；标题交给后台队列生成
+        with stage('persist_reply'):
+            needs_title = await run_db(save_assistant_reply, user_id, conversation_id, ''.join(accumulated))
+        if needs_title:
+            title_queue.submit(conversation_id)
+    if client_gone:
+        return
+    if error is not None:
+        # 响应头已经发出，只能在流里告知出错；纯文本输出直接结束
+        tail = output.event('error', {"message": "调用大模型失败"}) if hasattr(output, 'event') else ''
+    else:
+        tail = output.finish(conversation_id=conversation_id)
+    await send({'type': 'http.response.body', 'body': tail.encode('utf-8')})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await clients.async_client.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http' and scope['path'] == '/chat' and scope['method'] == 'POST':
+        return await chat(scope, receive, send)
+    return await flask_application(scope, receive, send)
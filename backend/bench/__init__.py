@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+# 性能基准脚本，在 backend 目录下用 python -m bench.<脚本名> 运行
+# 本地替身服务：fake_llm（兼容 OpenAI 的流式接口）、fake_sd（/image，可设延迟和图片大小）
+# 数据：seed 按规模生成用户、会话、带图片的消息
+# 场景：load_chat、load_http（会话列表、搜索、带图片的历史记录、/chat），suite 一键跑完全部场景
+# 进程内基准：bench_conversations、bench_search、bench_persist、bench_sd_pool（多个 fake_sd 实例的路由、故障切换和摘除）、
+# bench_prompt_index（10 万条相似提示词索引的查询和写入）
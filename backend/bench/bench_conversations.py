@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# 会话列表基准：验证 /api/conversations 的 SQL 查询次数不随会话数量增长
+# 用法：python -m bench.bench_conversations [--sizes 10,100,500]
+# 默认使用内存 SQLite，设置 DATABASE_URL 可以改用 MySQL
+import os
+import json
+import time
+import argparse
+import tempfile
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('BLOB_STORE_DIR', tempfile.mkdtemp(prefix='bench-blobs-'))
+
+from sqlalchemy import event
+from app import app, db, User, Conversation, Message, touch_conversation
+
+
+def seed_user(index, conversation_count):
+    user = User(username=f'bench_conv_{index}', email=f'bench_conv_{index}@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    for i in range(conversation_count):
+        conversation = Conversation(user_id=user.id, title=f'会话 {i}')
+        db.session.add(conversation)
+        db.session.flush()
+        for role, content in (('user', f'冰川保护 {i}'), ('assistant', f'[主题凝练] 冰封倒计时 {i}')):
+            db.session.add(Message(user_id=user.id, conversation_id=conversation.id, role=role, content=content))
+            touch_conversation(conversation, content)
+    db.session.commit()
+    return user.id
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10,100,500')
+    args = parser.parse_args()
+
+    counter = {'queries': 0}
+
+    with app.app_context():
+        db.create_all()
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(conn, cursor, statement, parameters, context, executemany):
+            counter['queries'] += 1
+
+        client = app.test_client()
+        for index, size in enumerate(int(s) for s in args.sizes.split(',')):
+            user_id = seed_user(index, size)
+            counter['queries'] = 0
+            start = time.perf_counter()
+            response = client.get(f'/api/conversations?user_id={user_id}&limit=200')
+            elapsed = time.perf_counter() - start
+            print(json.dumps({
+                "scenario": "conversations",
+                "conversations": size,
+                "returned": len(response.get_json()['conversations']),
+                "queries": counter['queries'],
+                "latency_ms": round(elapsed * 1000, 2)
+            }, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
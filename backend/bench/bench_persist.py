@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# 消息写入基准：对比逐条提交和组提交的每秒提交数、每秒写入消息数和单次保存耗时
+# 每个线程模拟若干轮对话，每轮保存一条用户消息和一条回复（回复等待提交完成，与 /chat 一致）
+# 用法：python -m bench.bench_persist [--threads 32 --turns 20]
+# 默认使用临时目录中的 SQLite 文件，设置 DATABASE_URL 可以改用 MySQL
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench-persist-'), 'bench.db'))
+os.environ.setdefault('BLOB_STORE_DIR', tempfile.mkdtemp(prefix='bench-blobs-'))
+
+from sqlalchemy import event
+from app import app, db, User, Conversation, message_writer, start_chat, user_message_saved, save_assistant_reply
+from bench.common import summarize, report
+
+
+def seed_conversations(count):
+    user = User(username=f'bench_persist_{time.time_ns()}', email=f'bench_persist_{time.time_ns()}@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    conversations = [Conversation(user_id=user.id, title='基准会话') for _ in range(count)]
+    db.session.add_all(conversations)
+    db.session.commit()
+    return user.id, [conversation.id for conversation in conversations]
+
+
+def run(mode, threads, turns, counter):
+    message_writer.enabled = mode == 'write-behind'
+    with app.app_context():
+        user_id, conversation_ids = seed_conversations(threads)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(conversation_id):
+        with app.app_context():
+            for turn in range(turns):
+                start = time.perf_counter()
+                _, _, saved = start_chat(user_id, conversation_id, f'冰川保护 {turn}')
+                user_message_saved(saved)
+                save_assistant_reply(user_id, conversation_id, f'[主题凝练] 冰封倒计时 {turn}')
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+
+    counter['commits'] = 0
+    workers = [threading.Thread(target=worker, args=(cid,)) for cid in conversation_ids]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    messages = threads * turns * 2
+    return summarize(
+        f'persist-{mode}', latencies, elapsed,
+        messages=messages,
+        messages_per_s=round(messages / elapsed, 2),
+        commits=counter['commits'],
+        commits_per_s=round(counter['commits'] / elapsed, 2),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--turns', type=int, default=20)
+    args = parser.parse_args()
+
+    counter = {'commits': 0}
+    with app.app_context():
+        db.create_all()
+
+        @event.listens_for(db.engine, 'commit')
+        def count_commit(conn):
+            counter['commits'] += 1
+
+    for mode in ('direct', 'write-behind'):
+        report(run(mode, args.threads, args.turns, counter))
+    print(json.dumps({"message_writer": message_writer.stats()}, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# 相似提示词索引基准：写入合成的 SD 提示词后测量建索引、从磁盘重新载入、查询和增量写入的耗时
+# 查询分两组：把已有提示词换语序、换同义词、加质量词后查询（应命中原条目），以及新生成的无关提示词（不应命中）
+# 用法：python -m bench.bench_prompt_index [--entries 100000 --queries 1000 --threshold 0.9]
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from prompt_index import PromptIndex
+from bench.common import summarize, report
+
+SUBJECTS = ['glacier', 'forest', 'ocean', 'city', 'mountain', 'desert', 'river', 'farmland', 'coral reef', 'volcano',
+            'polar bear', 'whale', 'panda', 'factory', 'wind turbine', 'solar panel', 'garbage dump', 'rainforest',
+            'school', 'hospital', 'village', 'highway', 'harbor', 'island', 'waterfall', 'library', 'market', 'bridge']
+MODIFIERS = ['melting', 'burning', 'flooded', 'polluted', 'quiet', 'crowded', 'abandoned', 'blooming', 'frozen',
+             'misty', 'ancient', 'futuristic', 'drought-stricken', 'snowy', 'sunlit', 'stormy', 'green', 'ruined']
+LIGHTING = [('sunset', 'dusk'), ('sunrise', 'daybreak'), ('night', 'night'), ('overcast', 'overcast'),
+            ('golden hour', 'golden hour'), ('moonlight', 'moonlight')]
+STYLES = ['watercolor', 'oil painting', 'photograph', 'flat illustration', 'cinematic', 'ink wash', 'low poly']
+MOTIFS = [f'motif{i}' for i in range(3000)]
+
+
+def make_prompt(rng):
+    # 返回 (提示词各部分, 换说法用的光线词)
+    lighting = rng.choice(LIGHTING)
+    parts = [f'{rng.choice(MODIFIERS)} {rng.choice(SUBJECTS)}', rng.choice(SUBJECTS), lighting[0],
+             rng.choice(STYLES), *rng.sample(MOTIFS, 3)]
+    return parts, lighting
+
+
+def reword(parts, lighting, rng):
+    # 换语序、把光线词换成同义说法、加上常见的质量词
+    parts = [lighting[1] if part == lighting[0] else part for part in parts]
+    first = parts[0].split(' ', 1)
+    parts[0] = f'{first[1]} {first[0]}' if len(first) == 2 else parts[0]
+    rng.shuffle(parts)
+    return ', '.join(['masterpiece', 'best quality'] + parts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--inserts', type=int, default=200, help='建好索引后逐条写入的条目数')
+    parser.add_argument('--threshold', type=float, default=0.9)
+    parser.add_argument('--path', help='索引文件，默认写到临时目录')
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(tempfile.mkdtemp(prefix='bench-prompt-index-'), 'prompt_index.sqlite3')
+    rng = random.Random(42)
+    generated = []
+
+    start = time.perf_counter()
+    index = PromptIndex(path)
+    chunk = []
+    for i in range(args.entries):
+        parts, lighting = make_prompt(rng)
+        generated.append((parts, lighting))
+        chunk.append(('bench', ', '.join(parts), f'blob{i}', 1000))
+        if len(chunk) >= 5000:
+            index.add_many(chunk)
+            chunk = []
+    if chunk:
+        index.add_many(chunk)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = PromptIndex(path)
+    load_seconds = time.perf_counter() - start
+    memory = index.signatures[:index.size].nbytes + sum(k.nbytes + r.nbytes for k, r in zip(index.band_keys, index.band_rows))
+    report({
+        "scenario": "build",
+        "entries": len(index),
+        "build_s": round(build_seconds, 2),
+        "reload_s": round(load_seconds, 2),
+        "file_mb": round(os.path.getsize(path) / 1024 / 1024, 1),
+        "index_mb": round(memory / 1024 / 1024, 1)
+    })
+
+    # 换说法的查询：命中原条目（或与原条目词集合相同的条目）才算找到
+    latencies, found, other = [], 0, 0
+    for _ in range(args.queries):
+        row = rng.randrange(len(generated))
+        parts, lighting = generated[row]
+        query = reword(parts, lighting, rng)
+        start = time.perf_counter()
+        match = index.lookup('bench', query, args.threshold)
+        latencies.append(time.perf_counter() - start)
+        if match is None:
+            continue
+        if match["image_hash"] == f'blob{row}' or match["similarity"] == 1.0:
+            found += 1
+        else:
+            other += 1
+    report(summarize('lookup_reworded', latencies, sum(latencies),
+                     recall=round(found / args.queries, 4), wrong_matches=other))
+
+    # 无关的新提示词：命中即为误判
+    latencies, false_matches = [], 0
+    for _ in range(args.queries):
+        parts, _lighting = make_prompt(rng)
+        start = time.perf_counter()
+        match = index.lookup('bench', ', '.join(parts), args.threshold)
+        latencies.append(time.perf_counter() - start)
+        false_matches += match is not None
+    report(summarize('lookup_unrelated', latencies, sum(latencies), false_matches=false_matches))
+
+    latencies = []
+    for i in range(args.inserts):
+        parts, _lighting = make_prompt(rng)
+        start = time.perf_counter()
+        index.add('bench', ', '.join(parts), f'extra{i}', 1000)
+        latencies.append(time.perf_counter() - start)
+    report(summarize('insert', latencies, sum(latencies), entries=len(index)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# SD 多实例路由基准：启动几个延迟不同的 fake_sd，并发调用 sd_post，统计各实例分到的请求数
+# 依次运行三个阶段：全部正常（最少进行中请求路由）、停掉一个实例（换实例重试）、移除一个实例（等进行中的请求结束）
+# 用法：python -m bench.bench_sd_pool [--delays 0.2,0.5,1.0 --threads 16 --requests 200]
+import sys
+import time
+import argparse
+import threading
+import subprocess
+from collections import Counter
+
+from llm_client import LLMClientManager
+from sd_pool import SDWorkerPool
+from bench.common import summarize, report
+from bench.suite import wait_for_port
+
+
+def run_phase(name, clients, threads, requests):
+    latencies, errors = [], []
+    served = Counter()
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                response = clients.sd_post('/image', json={'prompt': f'bench {start}'},
+                                           headers={'Accept': 'image/png'})
+                response.raise_for_status()
+                port = response.url.split(':')[2].split('/')[0]
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+                    served[port] += 1
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {str(e)[:200]}")
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    return workers, start, latencies, errors, served, name
+
+
+def finish_phase(phase):
+    workers, start, latencies, errors, served, name = phase
+    for thread in workers:
+        thread.join()
+    extra = {"errors": len(errors), "served_by_port": dict(sorted(served.items()))}
+    if errors:
+        extra["first_error"] = errors[0]
+    return summarize(name, latencies, time.perf_counter() - start, **extra)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--delays', default='0.2,0.5,1.0', help='各实例的生成耗时（秒），逗号分隔')
+    parser.add_argument('--base-port', type=int, default=9300)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    delays = [float(d) for d in args.delays.split(',')]
+    ports = [args.base_port + i for i in range(len(delays))]
+    processes = {}
+    for port, delay in zip(ports, delays):
+        processes[port] = subprocess.Popen([sys.executable, '-m', 'bench.fake_sd', '--port', str(port), '--delay', str(delay)],
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wait_for_port(port)
+
+    urls = [f'http://127.0.0.1:{port}' for port in ports]
+    pool = SDWorkerPool(urls, probe_interval=0.5, probe_timeout=1.0)
+    pool.start()
+    clients = LLMClientManager(api_key='bench', base_url='http://127.0.0.1:1', sd_pool=pool,
+                               sd_max_concurrency=args.threads, sd_max_retries=len(urls))
+    try:
+        # 1. 全部正常：延迟低的实例完成得快，进行中请求少，分到的请求更多
+        report(finish_phase(run_phase('least_outstanding', clients, args.threads, args.requests)))
+
+        # 2. 压测中途停掉最快的实例：失败的请求换实例重试，探活随后把它标记为不健康
+        phase = run_phase('failover', clients, args.threads, args.requests)
+        time.sleep(1)
+        processes[ports[0]].kill()
+        result = finish_phase(phase)
+        result["workers"] = {w['url']: w['healthy'] for w in pool.snapshot()}
+        report(result)
+
+        # 3. 压测中途移除一个实例：不再分配新请求，进行中的请求正常完成，不产生错误
+        phase = run_phase('drain', clients, args.threads, args.requests)
+        time.sleep(1)
+        drain_start = time.perf_counter()
+        removed = pool.remove(urls[1], timeout=30)
+        drain_ms = round((time.perf_counter() - drain_start) * 1000, 2)
+        result = finish_phase(phase)
+        result["drained"] = removed
+        result["drain_ms"] = drain_ms
+        result["remaining_workers"] = [w['url'] for w in pool.snapshot()]
+        report(result)
+    finally:
+        pool.close()
+        clients.close()
+        for process in processes.values():
+            process.kill()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# 搜索基准：生成中文合成语料后测量 /api/search 的延迟
+# 用法：python -m bench.bench_search [--messages 1000000] [--queries 200]
+# MySQL 下走 ngram 全文索引（DATABASE_URL 指向 MySQL），其他数据库走 LIKE 回退路径
+import os
+import time
+import random
+import argparse
+import tempfile
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('BLOB_STORE_DIR', tempfile.mkdtemp(prefix='bench-blobs-'))
+
+from app import app, db, User, Conversation, Message
+from bench.common import summarize, report
+
+TOPICS = ['冰川保护', '垃圾分类', '节约用水', '保护动物', '低碳出行', '植树造林', '关爱老人', '反对浪费',
+          '海洋污染', '森林防火', '无偿献血', '乡村教育', '心理健康', '网络安全', '文明交通', '光盘行动']
+PHRASES = ['每一滴融化，都在改写未来', '让地球重新呼吸', '行动从今天开始', '守护我们共同的家园',
+           '数据显示问题正在加剧', '需要每一个人的参与', '用微小的改变汇聚力量', '别让明天只剩回忆']
+
+
+def make_content(rng):
+    topic = rng.choice(TOPICS)
+    return f"[主题凝练] {topic} [震撼标语] {rng.choice(PHRASES)}❗️ 主：{rng.choice(PHRASES)}，{topic}刻不容缓 副：{rng.choice(PHRASES)}"
+
+
+def seed(total_messages, users, per_conversation, rng, chunk=5000):
+    user_ids = []
+    for i in range(users):
+        user = User(username=f'bench_search_{i}', email=f'bench_search_{i}@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        user_ids.append(user.id)
+    db.session.commit()
+
+    conversation_count = max(1, total_messages // per_conversation)
+    db.session.execute(db.insert(Conversation), [
+        {"user_id": user_ids[i % users], "title": f"{rng.choice(TOPICS)} 海报 {i}"}
+        for i in range(conversation_count)
+    ])
+    db.session.commit()
+    conversations = db.session.execute(db.select(Conversation.id, Conversation.user_id)).all()
+
+    rows = []
+    for i in range(total_messages):
+        conversation = conversations[i % len(conversations)]
+        rows.append({
+            "user_id": conversation.user_id,
+            "conversation_id": conversation.id,
+            "role": "assistant" if i % 2 else "user",
+            "content": make_content(rng)
+        })
+        if len(rows) >= chunk:
+            db.session.execute(db.insert(Message), rows)
+            db.session.commit()
+            rows = []
+    if rows:
+        db.session.execute(db.insert(Message), rows)
+        db.session.commit()
+    return user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        user_ids = seed(args.messages, args.users, 20, rng)
+        seed_seconds = time.perf_counter() - start
+
+        client = app.test_client()
+        latencies = []
+        hits = 0
+        start = time.perf_counter()
+        for _ in range(args.queries):
+            query = rng.choice(TOPICS + PHRASES)[:4]
+            t = time.perf_counter()
+            response = client.get('/api/search', query_string={'user_id': rng.choice(user_ids), 'q': query})
+            latencies.append(time.perf_counter() - t)
+            hits += len(response.get_json()['results']['messages'])
+        elapsed = time.perf_counter() - start
+
+        report(summarize(
+            'search', latencies, elapsed,
+            dialect=db.engine.dialect.name,
+            messages=args.messages,
+            seed_seconds=round(seed_seconds, 2),
+            avg_hits=round(hits / max(1, args.queries), 2)
+        ))
+
+
+if __name__ == '__main__':
+    main()
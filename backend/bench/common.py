@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# 基准脚本共用的统计工具，所有场景输出同样格式的 JSON，便于前后对比
+import json
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(scenario, latencies, elapsed, **extra):
+    # latencies 单位为秒，输出统一换算成毫秒
+    result = {
+        "scenario": scenario,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+    }
+    result.update(extra)
+    return result
+
+
+def report(result):
+    print(json.dumps(result, ensure_ascii=False))
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# 本地假大模型服务，兼容 OpenAI 的 /chat/completions 接口（流式与非流式），用于压测时替代 DeepSeek
+# 用法：python -m bench.fake_llm --port 9100 --tokens 200 --interval 0.02 --latency 0.3
+# 然后以 DEEPSEEK_BASE_URL=http://127.0.0.1:9100 启动后端
+import json
+import time
+import asyncio
+import argparse
+
+TOKENS = ['[主题凝练]', ' 冰封', '倒计时', '\n[震撼标语]', ' 每一滴', '融化，', '都在', '改写', '未来❗️',
+          '\n[分层文案]', '\n主：', '冰盖', '消退', '速度', '加快', '\n副：', '降温', '行动', '\n数据：', 'NASA2023']
+
+
+class FakeLLM:
+    def __init__(self, tokens=200, interval=0.02, latency=0.3):
+        self.tokens = tokens
+        self.interval = interval
+        self.latency = latency
+
+    def chunk(self, content, finish_reason=None):
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "fake",
+            "choices": [{"index": 0, "delta": {"content": content} if content is not None else {}, "finish_reason": finish_reason}]
+        }
+
+    def completion(self, content):
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "fake",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": self.tokens, "total_tokens": self.tokens}
+        }
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                payload = json.loads(body or b'{}')
+
+                await asyncio.sleep(self.latency)
+                if payload.get('stream'):
+                    await self.stream(writer)
+                else:
+                    data = json.dumps(self.completion('冰封倒计时'), ensure_ascii=False).encode('utf-8')
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                                 + f'Content-Length: {len(data)}\r\n\r\n'.encode() + data)
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def stream(self, writer):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n')
+        for i in range(self.tokens):
+            self.write_chunk(writer, self.chunk(TOKENS[i % len(TOKENS)]))
+            await writer.drain()
+            await asyncio.sleep(self.interval)
+        self.write_chunk(writer, self.chunk(None, 'stop'))
+        self.write_event(writer, b'data: [DONE]\n\n')
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    def write_chunk(self, writer, data):
+        self.write_event(writer, b'data: ' + json.dumps(data, ensure_ascii=False).encode('utf-8') + b'\n\n')
+
+    def write_event(self, writer, event):
+        writer.write(f'{len(event):x}\r\n'.encode() + event + b'\r\n')
+
+
+async def serve(host, port, fake):
+    server = await asyncio.start_server(fake.handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--tokens', type=int, default=200, help='每次回复的 token 数')
+    parser.add_argument('--interval', type=float, default=0.02, help='token 之间的间隔（秒）')
+    parser.add_argument('--rate', type=float, default=0, help='每秒 token 数，设置后覆盖 --interval')
+    parser.add_argument('--latency', type=float, default=0.3, help='首个 token 前的延迟（秒）')
+    args = parser.parse_args()
+    interval = 1 / args.rate if args.rate > 0 else args.interval
+    print(f"fake llm listening on http://{args.host}:{args.port}")
+    asyncio.run(serve(args.host, args.port, FakeLLM(args.tokens, interval, args.latency)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# 本地假 Stable Diffusion 服务，接口与 stablediffusion.ipynb 中的 Flask 服务一致（GET /hello、POST /image）
+# 不需要 GPU：按设定的延迟返回一张按提示词着色的纯色 PNG，用于联调异步图片任务和压测
+# 用法：python -m bench.fake_sd --port 9200 --delay 2
+# 然后以 API_URL=http://127.0.0.1:9200 启动后端
+import json
+import zlib
+import base64
+import struct
+import asyncio
+import hashlib
+import functools
+import argparse
+
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def solid_png(width, height, rgb, padding=0):
+    # 只用标准库生成 PNG，避免压测环境依赖 Pillow
+    # 纯色图压缩后只有几百字节，padding 大于 0 时追加一个解码器会忽略的私有辅助块，把文件撑到接近真实照片的大小
+    row = b'\x00' + bytes(rgb) * width
+    extra = b''
+    if padding > 0:
+        seed = hashlib.sha256(bytes(rgb)).digest()
+        noise = (seed * (padding // len(seed) + 1))[:padding]
+        extra = png_chunk(b'bnCh', noise)
+    return (b'\x89PNG\r\n\x1a\n'
+            + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + png_chunk(b'IDAT', zlib.compress(row * height))
+            + extra
+            + png_chunk(b'IEND', b''))
+
+
+class FakeSD:
+    def __init__(self, delay=2.0, size=400, fail_rate=0.0, payload_kb=0):
+        self.delay = delay
+        self.size = size
+        self.fail_rate = fail_rate
+        self.payload_bytes = int(payload_kb * 1024)
+        self.count = 0
+
+    @functools.lru_cache(maxsize=256)
+    def render(self, prompt, steps=20):
+        # 同一提示词和步数得到同一张图，与固定随机种子的真实服务行为一致
+        rgb = hashlib.sha256(f"{prompt or ''}\x00{steps}".encode('utf-8')).digest()[:3]
+        return solid_png(self.size, self.size, rgb, self.payload_bytes)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                if method == 'GET' and path == '/hello':
+                    await self.respond(writer, 200, b'helloworld!', 'text/html; charset=utf-8')
+                elif method == 'POST' and path == '/image':
+                    await self.image(writer, json.loads(body or b'{}'), 'image/png' in headers.get('accept', ''))
+                else:
+                    await self.respond(writer, 404, b'not found', 'text/plain')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def image(self, writer, data, binary=False):
+        if not data:
+            return await self.respond_json(writer, 400, {"error": "No data provided"})
+        self.count += 1
+        # delay 为 20 步的耗时，草图等少步数请求按比例缩短
+        steps = int(data.get('steps') or (6 if data.get('profile') == 'draft' else 20))
+        await asyncio.sleep(self.delay * steps / 20)
+        if self.fail_rate and (self.count * self.fail_rate) % 1 < self.fail_rate:
+            return await self.respond_json(writer, 500, {"error": "fake failure"})
+        png = self.render(data.get('prompt'), steps)
+        if binary:
+            # 与 sd_server 一致：Accept: image/png 时直接返回 PNG 字节
+            return await self.respond(writer, 200, png, 'image/png')
+        await self.respond_json(writer, 200, {
+            "status": "success",
+            "message": "Data received successfully",
+            "respond": {"img_base64": base64.b64encode(png).decode('ascii')}
+        })
+
+    async def respond_json(self, writer, status, payload):
+        await self.respond(writer, status, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    async def respond(self, writer, status, body, content_type):
+        writer.write(f'HTTP/1.1 {status} OK\r\nContent-Type: {content_type}\r\n'
+                     f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+        await writer.drain()
+
+
+async def serve(host, port, fake):
+    server = await asyncio.start_server(fake.handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9200)
+    parser.add_argument('--delay', type=float, default=2.0, help='20 步生成一张图的耗时（秒），少步数的请求按比例缩短')
+    parser.add_argument('--size', type=int, default=400, help='图片边长（像素）')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='返回 500 的比例')
+    parser.add_argument('--payload-kb', type=float, default=0, help='PNG 文件大小（KB），0 表示不填充')
+    args = parser.parse_args()
+    print(f"fake stable diffusion listening on http://{args.host}:{args.port}")
+    asyncio.run(serve(args.host, args.port, FakeSD(args.delay, args.size, args.fail_rate, args.payload_kb)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# /chat 流式并发压测：统计首字节时间、完整耗时和吞吐
+# 用法：
+#   python -m bench.fake_llm --port 9100
+#   DEEPSEEK_BASE_URL=http://127.0.0.1:9100 uvicorn asgi:application --port 5000   # 或 python app.py 对比 WSGI
+#   python -m bench.load_chat --url http://127.0.0.1:5000 --user-id 1 --concurrency 500 --requests 2000
+import time
+import asyncio
+import argparse
+import httpx
+
+from bench.common import summarize, report, percentile
+
+
+async def one_chat(client, url, user_id, conversation_id, option):
+    start = time.perf_counter()
+    first_byte = None
+    size = 0
+    async with client.stream('POST', url + '/chat', json={
+        "message": "冰川保护",
+        "option": option,
+        "user_id": user_id,
+        "conversation_id": conversation_id,
+    }) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            size += len(chunk)
+    return first_byte or 0.0, time.perf_counter() - start, size
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        # 先建一个会话，所有请求都写入同一个会话
+        response = await client.post(args.url + '/api/conversations', json={"user_id": args.user_id, "title": "压测会话"})
+        conversation_id = response.json()["conversation"]["id"]
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        first_bytes, latencies, errors = [], [], 0
+
+        async def worker():
+            nonlocal errors
+            async with semaphore:
+                try:
+                    ttfb, total, _ = await one_chat(client, args.url, args.user_id, conversation_id, args.option)
+                    first_bytes.append(ttfb)
+                    latencies.append(total)
+                except Exception:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    report(summarize(
+        'chat_stream', latencies, elapsed,
+        concurrency=args.concurrency,
+        errors=errors,
+        ttfb_p50_ms=round(percentile(first_bytes, 50) * 1000, 2),
+        ttfb_p99_ms=round(percentile(first_bytes, 99) * 1000, 2)
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--option', default='文案')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--timeout', type=float, default=120)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# 历史记录相关接口的并发压测，压测对象取自 bench.seed 生成的数据
+# 场景：
+#   conversations  会话最多的用户翻页加载会话列表
+#   search         随机用户、随机关键词搜索
+#   history        加载图片最多的会话的消息列表，并像浏览器一样并发下载页面中的全部图片
+#   chat           /chat 流式回复（需要假大模型服务，见 bench.fake_llm）
+# 用法：python -m bench.load_http --url http://127.0.0.1:5000 --manifest seed.json --scenario history --concurrency 50
+import json
+import time
+import random
+import asyncio
+import argparse
+import httpx
+
+from bench.common import summarize, report
+from bench.load_chat import one_chat
+
+SCENARIOS = ('conversations', 'search', 'history', 'chat')
+
+
+class Scenario:
+    def __init__(self, client, url, manifest, args, rng):
+        self.client = client
+        self.url = url
+        self.manifest = manifest
+        self.args = args
+        self.rng = rng
+        self.bytes = 0
+        self.images = 0
+        self.chat_conversation = None
+
+    async def get(self, path, **params):
+        response = await self.client.get(self.url + path, params=params)
+        response.raise_for_status()
+        self.bytes += len(response.content)
+        return response
+
+    async def conversations(self):
+        user_id = self.rng.choice(self.manifest['top_users'])
+        cursor = None
+        for _ in range(self.args.pages):
+            params = {"user_id": user_id, "limit": self.args.page_size}
+            if cursor:
+                params["cursor"] = cursor
+            data = (await self.get('/api/conversations', **params)).json()
+            cursor = data.get('next_cursor')
+            if not cursor:
+                break
+
+    async def search(self):
+        await self.get('/api/search', user_id=self.rng.choice(self.manifest['user_ids']),
+                       q=self.rng.choice(self.manifest['queries']))
+
+    async def history(self):
+        conversation = self.rng.choice(self.manifest['image_conversations'])
+        data = (await self.get(f"/api/conversations/{conversation['id']}/messages",
+                               user_id=conversation['user_id'], limit=self.args.page_size)).json()
+        urls = [message['image_url'] for message in data['conversation']['messages'] if message.get('image_url')]
+        # 浏览器对同一域名最多并发 6 个连接
+        semaphore = asyncio.Semaphore(6)
+
+        async def fetch(url):
+            async with semaphore:
+                await self.get(url)
+
+        await asyncio.gather(*(fetch(url) for url in urls))
+        self.images += len(urls)
+
+    async def chat(self):
+        if self.chat_conversation is None:
+            response = await self.client.post(self.url + '/api/conversations',
+                                              json={"user_id": self.manifest['user_ids'][0], "title": "压测会话"})
+            self.chat_conversation = response.json()["conversation"]["id"]
+        _, _, size = await one_chat(self.client, self.url, self.manifest['user_ids'][0], self.chat_conversation, '文案')
+        self.bytes += size
+
+
+async def run(args, manifest):
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency * 6, max_keepalive_connections=args.concurrency * 6)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        scenario = Scenario(client, args.url, manifest, args, rng)
+        action = getattr(scenario, args.scenario)
+        if args.scenario == 'chat':
+            await scenario.chat()
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies, errors = [], []
+
+        async def worker():
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await action()
+                    latencies.append(time.perf_counter() - start)
+                except Exception as e:
+                    errors.append(f"{type(e).__name__}: {str(e)[:200]}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    extra = {"concurrency": args.concurrency, "errors": len(errors), "mb_per_s": round(scenario.bytes / elapsed / 1e6, 2)}
+    if errors:
+        extra["first_error"] = errors[0]
+    if args.scenario == 'history':
+        extra["images_per_load"] = round(scenario.images / max(1, len(latencies)), 1)
+    return summarize(args.scenario, latencies, elapsed, **extra)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--manifest', default='seed.json')
+    parser.add_argument('--scenario', choices=SCENARIOS, default='conversations')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--pages', type=int, default=3, help='conversations 场景每次加载的页数')
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    with open(args.manifest, encoding='utf-8') as f:
+        manifest = json.load(f)
+    report(asyncio.run(run(args, manifest)))
+
+
+if __name__ == '__main__':
+    main()
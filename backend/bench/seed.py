@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# 压测数据生成：按设定规模写入用户、会话和消息，其中一部分是带图片的消息（图片写入图片存储，消息只保存哈希）
+# 用法：python -m bench.seed --users 50 --conversations 200 --messages 20 --image-ratio 0.25 --out seed.json
+# 使用 DATABASE_URL / BLOB_STORE_DIR 指定的数据库和图片存储；输出的 JSON 供 bench.load_http 选择压测对象
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from app import app, db, blob_store, User, Conversation, Message, make_preview
+from bench.fake_sd import solid_png
+from bench.bench_search import TOPICS, PHRASES, make_content
+
+
+def seed_images(count, size, payload_kb, rng):
+    # 不同的图片只写一次，消息按哈希引用，与真实数据中图片被多条消息引用的情况一致
+    images = []
+    for _ in range(count):
+        rgb = bytes(rng.randrange(256) for _ in range(3))
+        images.append(blob_store.put(solid_png(size, size, rgb, int(payload_kb * 1024))))
+    return images
+
+
+def seed(args, rng):
+    suffix = int(time.time())
+    users = [{"username": f"bench_{suffix}_{i}", "email": f"bench_{suffix}_{i}@example.com", "password_hash": "x"}
+             for i in range(args.users)]
+    db.session.execute(db.insert(User), users)
+    db.session.commit()
+    user_ids = list(db.session.scalars(
+        db.select(User.id).where(User.username.like(f"bench_{suffix}_%")).order_by(User.id)
+    ))
+
+    images = seed_images(args.distinct_images, args.image_size, args.image_kb, rng) if args.image_ratio > 0 else []
+    start_time = datetime.now() - timedelta(days=30)
+    # 会话数量按幂律分布到用户上：少数用户拥有大量会话，用于会话列表场景
+    weights = [1 / (i + 1) for i in range(len(user_ids))]
+    conversation_users = rng.choices(user_ids, weights=weights, k=args.conversations)
+
+    totals = {"users": len(user_ids), "conversations": 0, "messages": 0, "image_messages": 0}
+    per_user = {}
+    image_counts = {}
+    for offset in range(0, len(conversation_users), args.chunk):
+        owners = conversation_users[offset:offset + args.chunk]
+        conversations = [Conversation(user_id=owner, title=f"{rng.choice(TOPICS)} 海报") for owner in owners]
+        db.session.add_all(conversations)
+        db.session.flush()
+
+        rows = []
+        for conversation in conversations:
+            at = start_time + timedelta(seconds=rng.randrange(30 * 86400))
+            count = max(1, int(rng.expovariate(1 / args.messages)))
+            for i in range(count):
+                at += timedelta(seconds=rng.randrange(5, 120))
+                row = {
+                    "user_id": conversation.user_id,
+                    "conversation_id": conversation.id,
+                    "role": "assistant" if i % 2 else "user",
+                    "content": make_content(rng) if i % 2 else rng.choice(TOPICS),
+                    "has_image": False,
+                    "image_hash": None,
+                    "image_size": None,
+                    "created_at": at,
+                }
+                if i % 2 and images and rng.random() < args.image_ratio:
+                    image_hash, image_size = rng.choice(images)
+                    row.update(content="背景图片已生成", has_image=True, image_hash=image_hash, image_size=image_size)
+                    image_counts[conversation.id] = image_counts.get(conversation.id, 0) + 1
+                rows.append(row)
+            conversation.updated_at = conversation.last_message_at = at
+            conversation.last_message_preview = make_preview(rows[-1]["content"])
+            per_user[conversation.user_id] = per_user.get(conversation.user_id, 0) + 1
+        db.session.execute(db.insert(Message), rows)
+        db.session.commit()
+        totals["conversations"] += len(conversations)
+        totals["messages"] += len(rows)
+        totals["image_messages"] += sum(1 for row in rows if row["has_image"])
+
+    conversation_owner = dict(db.session.execute(
+        db.select(Conversation.id, Conversation.user_id).where(Conversation.id.in_(list(image_counts)))
+    ).all()) if image_counts else {}
+    heavy_conversations = sorted(image_counts, key=image_counts.get, reverse=True)[:args.top]
+    return dict(
+        totals,
+        user_ids=user_ids,
+        # 会话最多的用户，会话列表场景使用
+        top_users=sorted(per_user, key=per_user.get, reverse=True)[:args.top],
+        # 图片最多的会话，历史记录场景使用
+        image_conversations=[{"id": cid, "user_id": conversation_owner[cid], "images": image_counts[cid]}
+                             for cid in heavy_conversations],
+        queries=[phrase[:4] for phrase in TOPICS + PHRASES],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--conversations', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=20, help='每个会话的平均消息数（指数分布）')
+    parser.add_argument('--image-ratio', type=float, default=0.25, help='回复中带图片的比例')
+    parser.add_argument('--distinct-images', type=int, default=50)
+    parser.add_argument('--image-size', type=int, default=400)
+    parser.add_argument('--image-kb', type=float, default=200, help='每张图片的大小（KB）')
+    parser.add_argument('--chunk', type=int, default=500, help='每个事务写入的会话数')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='seed.json')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        manifest = seed(args, random.Random(args.seed))
+        manifest.update(seed_seconds=round(time.perf_counter() - start, 2), dialect=db.engine.dialect.name)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(json.dumps({key: manifest[key] for key in ('users', 'conversations', 'messages', 'image_messages', 'seed_seconds')}))
+
+
+if __name__ == '__main__':
+    main()
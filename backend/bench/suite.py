@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# 一键跑完整套基准：启动假大模型和假 SD 服务、生成数据、启动后端，依次压测各场景，结果合并写入一个 JSON 文件
+# 用法：python -m bench.suite --out bench_results.json [--server flask --conversations 2000 --concurrency 50 --requests 500]
+# 默认在临时目录中使用 SQLite 和本地图片存储；设置 DATABASE_URL 后改用该数据库（例如 MySQL）
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from types import SimpleNamespace
+
+from bench import load_http
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"端口 {port} 未就绪")
+
+
+def start(command, env, port):
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--llm-port', type=int, default=9100)
+    parser.add_argument('--sd-port', type=int, default=9200)
+    parser.add_argument('--server', choices=('asgi', 'flask'), default='asgi', help='asgi 用 uvicorn 启动，flask 用多线程开发服务器')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn 进程数')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--conversations', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--image-kb', type=float, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--scenarios', default=','.join(load_http.SCENARIOS))
+    parser.add_argument('--token-rate', type=float, default=50, help='假大模型每秒 token 数')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-suite-')
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(workdir, 'bench.db'))
+    env.setdefault('BLOB_STORE_DIR', os.path.join(workdir, 'blobs'))
+    env.update(DEEPSEEK_BASE_URL=f'http://127.0.0.1:{args.llm_port}', DEEP_API_KEY=env.get('DEEP_API_KEY', 'bench'),
+               API_URL=f'http://127.0.0.1:{args.sd_port}')
+    manifest_path = os.path.join(workdir, 'seed.json')
+
+    processes = []
+    try:
+        processes.append(start([sys.executable, '-m', 'bench.fake_llm', '--port', str(args.llm_port),
+                                '--rate', str(args.token_rate), '--tokens', '100'], env, args.llm_port))
+        processes.append(start([sys.executable, '-m', 'bench.fake_sd', '--port', str(args.sd_port),
+                                '--payload-kb', str(args.image_kb)], env, args.sd_port))
+        subprocess.run([sys.executable, '-m', 'bench.seed', '--users', str(args.users),
+                        '--conversations', str(args.conversations), '--messages', str(args.messages),
+                        '--image-kb', str(args.image_kb), '--out', manifest_path], env=env, check=True)
+        if args.server == 'asgi':
+            server = [sys.executable, '-m', 'uvicorn', 'asgi:application', '--port', str(args.port),
+                      '--workers', str(args.workers), '--log-level', 'warning']
+        else:
+            server = [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(args.port), '--with-threads']
+        processes.append(start(server, env, args.port))
+
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        results = []
+        for scenario in args.scenarios.split(','):
+            options = SimpleNamespace(url=f'http://127.0.0.1:{args.port}', scenario=scenario,
+                                      concurrency=args.concurrency, requests=args.requests,
+                                      pages=3, page_size=50, timeout=120, seed=0)
+            result = asyncio.run(load_http.run(options, manifest))
+            load_http.report(result)
+            results.append(result)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+    summary = {
+        "server": args.server,
+        "database": env['DATABASE_URL'].split(':', 1)[0],
+        "dataset": {key: manifest[key] for key in ('users', 'conversations', 'messages', 'image_messages')},
+        "results": results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
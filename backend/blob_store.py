@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# 内容寻址的图片存储：按 sha256 存放图片原始字节，相同图片只保存一份
+import os
+import hashlib
+import tempfile
+from abc import ABC, abstractmethod
+
+
+def sniff_mimetype(head):
+    # 根据文件头判断图片类型
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    return 'application/octet-stream'
+
+
+class BlobStore(ABC):
+    """图片存储后端的接口，其他后端（对象存储等）继承后实现全部方法，缺少任何一个时无法实例化"""
+
+    @abstractmethod
+    def put(self, data):
+        """保存字节数据，返回 (hash, size)；已存在的内容不会重复写入"""
+
+    @abstractmethod
+    def put_stream(self, source, max_size=None):
+        """从文件对象或字节块迭代器边读边写，不在内存中保留完整内容；超过 max_size 时抛出 ValueError"""
+
+    @abstractmethod
+    def open(self, blob_hash):
+        """以二进制只读方式打开，不存在时抛出 FileNotFoundError"""
+
+    @abstractmethod
+    def exists(self, blob_hash):
+        """内容是否存在"""
+
+    @abstractmethod
+    def size(self, blob_hash):
+        """字节数，不存在时抛出 FileNotFoundError"""
+
+    @abstractmethod
+    def delete(self, blob_hash):
+        """删除内容，不存在时不报错"""
+
+
+class LocalBlobStore(BlobStore):
+    """本地磁盘存储，路径为 root/ab/cd/<hash>"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, blob_hash):
+        if not is_valid_hash(blob_hash):
+            raise FileNotFoundError(blob_hash)
+        return os.path.join(self.root, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    def put(self, data):
+        blob_hash = hashlib.sha256(data).hexdigest()
+        path = self.path(blob_hash)
+        if os.path.exists(path):
+            return blob_hash, len(data)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，避免并发写入时读到半个文件
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return blob_hash, len(data)
+
+    def put_stream(self, source, max_size=None):
+        # 边读边算哈希写入临时文件，写完后按哈希原子改名
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter_chunks(source):
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise ValueError(f"图片超过大小限制 {max_size} 字节")
+                    digest.update(chunk)
+                    f.write(chunk)
+            blob_hash = digest.hexdigest()
+            path = self.path(blob_hash)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return blob_hash, size
+
+    def open(self, blob_hash):
+        return open(self.path(blob_hash), 'rb')
+
+    def exists(self, blob_hash):
+        try:
+            return os.path.exists(self.path(blob_hash))
+        except FileNotFoundError:
+            return False
+
+    def size(self, blob_hash):
+        return os.path.getsize(self.path(blob_hash))
+
+    def delete(self, blob_hash):
+        try:
+            os.remove(self.path(blob_hash))
+        except FileNotFoundError:
+            pass
+
+
+def iter_chunks(source, chunk_size=64 * 1024):
+    # 文件对象按块读取，其他可迭代对象（如 requests 的 iter_content）原样迭代
+    if hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        for chunk in source:
+            if chunk:
+                yield chunk
+
+
+def is_valid_hash(blob_hash):
+    return (
+        isinstance(blob_hash, str)
+        and len(blob_hash) == 64
+        and all(c in '0123456789abcdef' for c in blob_hash)
+    )
+
+
+# 可插拔后端注册表，新增后端时在这里登记
+BACKENDS = {
+    'local': LocalBlobStore,
+}
+
+
+def create_blob_store(backend, **options):
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的图片存储后端: {backend}")
+    return BACKENDS[backend](**options)
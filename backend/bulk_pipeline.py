@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# 批量海报流水线：一批主题依次经过 文案 → SD 提示词 → 背景图 → 合成海报 → 入库
+# 大模型阶段和 SD 阶段各自限制并发，入库按批次合并写入；每个阶段的结果写入检查点，中断后可以从检查点继续
+import io
+import csv
+import json
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+STAGES = ('copy', 'prompt', 'image', 'poster', 'persist')
+
+
+def read_topics(stream, fmt):
+    # 读取 CSV（需要 topic 列，可选 id 列；没有表头时取第一列）或 JSONL（{"topic": ..., "id": ...}）
+    text = stream.read()
+    if isinstance(text, bytes):
+        text = text.decode('utf-8-sig')
+    items = []
+    if fmt == 'jsonl':
+        for line in text.splitlines():
+            if line.strip():
+                row = json.loads(line)
+                items.append((row.get('id'), row.get('topic')))
+    elif fmt == 'csv':
+        rows = list(csv.reader(io.StringIO(text)))
+        if rows and 'topic' in rows[0]:
+            header = rows[0]
+            for row in rows[1:]:
+                record = dict(zip(header, row))
+                items.append((record.get('id'), record.get('topic')))
+        else:
+            items = [(None, row[0]) for row in rows if row]
+    else:
+        raise ValueError(f"不支持的输入格式: {fmt}")
+
+    topics = []
+    seen = set()
+    for item_id, topic in items:
+        topic = (topic or '').strip()
+        key = str(item_id).strip() if item_id not in (None, '') else topic
+        if topic and key not in seen:
+            seen.add(key)
+            topics.append({"key": key, "topic": topic})
+    return topics
+
+
+class Checkpoint:
+    """追加写入的 JSONL，每行是某个条目在某一阶段完成后新增的字段，同一条目后写的覆盖先写的"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.state.setdefault(record.pop('key'), {}).update(record)
+        except FileNotFoundError:
+            pass
+
+    def get(self, key):
+        with self.lock:
+            return dict(self.state.get(key, {}))
+
+    def record(self, key, **fields):
+        with self.lock:
+            self.state.setdefault(key, {}).update(fields)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(dict(fields, key=key), ensure_ascii=False) + '\n')
+
+
+class StageStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, start, end, ok):
+        with self.lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.busy_seconds += end - start
+            self.first_start = start if self.first_start is None else min(self.first_start, start)
+            self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+    def snapshot(self):
+        with self.lock:
+            wall = (self.last_end - self.first_start) if self.first_start is not None else 0.0
+            done = self.completed + self.failed
+            return {
+                "completed": self.completed,
+                "failed": self.failed,
+                "per_second": round(self.completed / wall, 2) if wall > 0 else 0.0,
+                "avg_ms": round(self.busy_seconds / done * 1000, 2) if done else 0.0,
+            }
+
+
+class BulkPipeline:
+    def __init__(self, copywriter, prompter, painter, composer, persister, checkpoint,
+                 llm_workers=8, sd_workers=4, persist_batch=50, persist_interval=1.0):
+        # copywriter(topic) -> 文案；prompter(文案) -> SD 提示词；painter(提示词) -> 背景图哈希
+        # composer(背景图哈希, 文案) -> 海报哈希；persister([state, ...]) -> {key: conversation_id}
+        self.copywriter = copywriter
+        self.prompter = prompter
+        self.painter = painter
+        self.composer = composer
+        self.persister = persister
+        self.checkpoint = checkpoint
+        self.persist_batch = persist_batch
+        self.persist_interval = persist_interval
+
+        self.llm_pool = ThreadPoolExecutor(llm_workers, thread_name_prefix='bulk-llm')
+        # SD 阶段的并发与 SD 服务的批大小一致，并发请求会被服务端合并成一次批量推理
+        self.sd_pool = ThreadPoolExecutor(sd_workers, thread_name_prefix='bulk-sd')
+        self.persist_queue = queue.Queue()
+        self.stats = {stage: StageStats() for stage in STAGES}
+
+        self.lock = threading.Lock()
+        self.done = threading.Condition(self.lock)
+        self.total = 0
+        self.outstanding = 0
+        self.skipped = 0
+        self.failed = []
+        self.started_at = None
+        self.finished_at = None
+
+    def _stage(self, stage, item, func, *args):
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception as e:
+            self.stats[stage].record(start, time.perf_counter(), False)
+            self.checkpoint.record(item["key"], error=f"{stage}: {str(e)}")
+            raise
+        self.stats[stage].record(start, time.perf_counter(), True)
+        return result
+
+    def _llm(self, item):
+        # 文案和提示词两个大模型阶段
+        state = self.checkpoint.get(item["key"])
+        try:
+            if 'copy' not in state:
+                state['copy'] = self._stage('copy', item, self.copywriter, item["topic"])
+                self.checkpoint.record(item["key"], topic=item["topic"], copy=state['copy'])
+            if 'prompt' not in state:
+                state['prompt'] = self._stage('prompt', item, self.prompter, state['copy'])
+                self.checkpoint.record(item["key"], prompt=state['prompt'])
+        except Exception:
+            return self._fail(item)
+        self.sd_pool.submit(self._sd, item)
+
+    def _sd(self, item):
+        state = self.checkpoint.get(item["key"])
+        try:
+            if 'image_hash' not in state:
+                state['image_hash'] = self._stage('image', item, self.painter, state['prompt'])
+                self.checkpoint.record(item["key"], image_hash=state['image_hash'])
+            if 'poster_hash' not in state:
+                state['poster_hash'] = self._stage('poster', item, self.composer, state['image_hash'], state['copy'])
+                self.checkpoint.record(item["key"], poster_hash=state['poster_hash'])
+        except Exception:
+            return self._fail(item)
+        self.persist_queue.put(dict(state, key=item["key"], topic=item["topic"]))
+
+    def _persist_loop(self):
+        # 攒够一批或等待超时后合并写入
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.persist_interval
+            while len(batch) < self.persist_batch:
+                try:
+                    state = self.persist_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if state is None:
+                    self._flush(batch)
+                    return
+                batch.append(state)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            conversation_ids = self.persister(batch)
+        except Exception as e:
+            end = time.perf_counter()
+            for state in batch:
+                self.stats['persist'].record(start, end, False)
+                self.checkpoint.record(state["key"], error=f"persist: {str(e)}")
+                self._fail(state)
+            return
+        end = time.perf_counter()
+        for state in batch:
+            self.stats['persist'].record(start, end, True)
+            self.checkpoint.record(state["key"], persisted=True, conversation_id=conversation_ids.get(state["key"]))
+            self._finish()
+
+    def _fail(self, item):
+        with self.lock:
+            self.failed.append(item["key"])
+        self._finish()
+
+    def _finish(self):
+        with self.done:
+            self.outstanding -= 1
+            if self.outstanding == 0:
+                self.done.notify_all()
+
+    def run(self, topics):
+        # 阻塞直到所有条目完成或失败，已入库的条目直接跳过
+        self.started_at = time.time()
+        pending = []
+        for item in topics:
+            if self.checkpoint.get(item["key"]).get('persisted'):
+                self.skipped += 1
+            else:
+                pending.append(item)
+        with self.lock:
+            self.total = len(topics)
+            self.outstanding = len(pending)
+
+        persister = threading.Thread(target=self._persist_loop, name='bulk-persist', daemon=True)
+        persister.start()
+        for item in pending:
+            state = self.checkpoint.get(item["key"])
+            if 'prompt' in state:
+                self.sd_pool.submit(self._sd, item)
+            else:
+                self.llm_pool.submit(self._llm, item)
+
+        with self.done:
+            self.done.wait_for(lambda: self.outstanding == 0)
+        self.persist_queue.put(None)
+        persister.join()
+        self.llm_pool.shutdown()
+        self.sd_pool.shutdown()
+        self.finished_at = time.time()
+        return self.summary()
+
+    def summary(self):
+        with self.lock:
+            end = self.finished_at or time.time()
+            return {
+                "total": self.total,
+                "remaining": self.outstanding,
+                "skipped": self.skipped,
+                "failed": list(self.failed),
+                "finished": self.finished_at is not None,
+                "elapsed_s": round(end - self.started_at, 2) if self.started_at else 0.0,
+                "stages": {stage: stats.snapshot() for stage, stats in self.stats.items()},
+            }
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# /chat 的输出格式：默认纯文本；format=sse/ndjson 时输出结构化事件
+#   delta  每个文本增量
+#   field  文案的某个部分（[主题凝练]、[震撼标语]、主/副/数据 等）完整生成后立即推送
+#   done   流结束，附带去除思考后的完整文本和全部字段
+import re
+import json
+
+from think_filter import ThinkFilter
+
+# 分节标记后的字段名，与 extract_info 的键一致；分层文案本身不是字段，只开启 主/副/数据 子字段
+SECTION_FIELDS = {
+    "主题凝练": "主题凝练",
+    "震撼标语": "震撼标语",
+    "视觉隐喻": "视觉隐喻",
+    "分层文案": None,
+}
+LAYERED_FIELDS = {"主": "分层文案-主", "副": "分层文案-副", "数据": "分层文案-数据"}
+SECTION_MARKER = re.compile(r'\[([^\[\]\n]{1,12})\]')
+# 主/副/数据 必须在行首，模型也可能照抄格式写成 主文案：、数据支撑：
+LAYERED_MARKER = re.compile(r'\[([^\[\]\n]{1,12})\]|(?<![^\s])(?:(主|副|数据)(?:文案|支撑)?|(情感共鸣点设计))[：:]')
+MAX_MARKER_LENGTH = 14
+
+
+class CopyFieldParser:
+    """单遍增量解析文案结构：遇到下一个标记时上一个字段即完整"""
+
+    def __init__(self):
+        self.buffer = ''
+        self.scan_from = 0
+        self.field = None
+        self.field_start = 0
+        self.layered = False
+        self.fields = {}
+
+    def feed(self, text):
+        self.buffer += text
+        completed = []
+        pattern = LAYERED_MARKER if self.layered else SECTION_MARKER
+        while True:
+            match = pattern.search(self.buffer, self.scan_from)
+            if match is None:
+                break
+            self._close(match.start(), completed)
+            if match.group(1) is not None:
+                name = match.group(1).strip()
+                self.field = SECTION_FIELDS.get(name)
+                self.layered = name == "分层文案"
+                pattern = LAYERED_MARKER if self.layered else SECTION_MARKER
+            elif match.group(2) is not None:
+                self.field = LAYERED_FIELDS[match.group(2)]
+            else:
+                # 分层文案之后的说明部分，不属于任何字段
+                self.field = None
+            self.field_start = self.scan_from = match.end()
+        # 末尾可能是半个标记，下次从这里重新查找
+        self.scan_from = max(self.field_start, len(self.buffer) - MAX_MARKER_LENGTH)
+        return completed
+
+    def close(self):
+        completed = []
+        self._close(len(self.buffer), completed)
+        self.field = None
+        return completed
+
+    def _close(self, end, completed):
+        if self.field is None:
+            return
+        value = self.buffer[self.field_start:end].strip()
+        self.fields[self.field] = value
+        completed.append((self.field, value))
+
+
+def format_event(fmt, name, payload):
+    # fmt 为 sse 或 ndjson
+    if fmt == 'sse':
+        return f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    return json.dumps(dict(payload, event=name), ensure_ascii=False) + '\n'
+
+
+class PlainOutput:
+    content_type = 'text/plain'
+    headers = {}
+
+    def __init__(self, strip_think=False):
+        self.think_filter = ThinkFilter() if strip_think else None
+
+    def feed(self, content):
+        return self.think_filter.feed(content) if self.think_filter else content
+
+    def finish(self, **info):
+        return self.think_filter.flush() if self.think_filter else ''
+
+
+class StructuredOutput:
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+    def __init__(self, fmt, strip_think=False):
+        self.fmt = fmt
+        self.content_type = 'text/event-stream' if fmt == 'sse' else 'application/x-ndjson'
+        self.strip_think = strip_think
+        # 字段始终从去除思考后的文本中解析
+        self.think_filter = ThinkFilter()
+        self.parser = CopyFieldParser()
+        self.cleaned = []
+
+    def event(self, name, payload):
+        return format_event(self.fmt, name, payload)
+
+    def _emit(self, raw, clean, completed):
+        output = []
+        delta = clean if self.strip_think else raw
+        if delta:
+            output.append(self.event('delta', {"text": delta}))
+        for name, value in completed:
+            output.append(self.event('field', {"name": name, "value": value}))
+        return ''.join(output)
+
+    def feed(self, content):
+        clean = self.think_filter.feed(content)
+        self.cleaned.append(clean)
+        return self._emit(content, clean, self.parser.feed(clean))
+
+    @property
+    def prompt(self):
+        return ''.join(self.cleaned)
+
+    def flush(self):
+        # 文本流结束：输出剩余的增量和字段事件，之后还可以追加其他事件，最后再调用 done
+        tail = self.think_filter.flush()
+        self.cleaned.append(tail)
+        completed = self.parser.feed(tail) + self.parser.close()
+        return self._emit(tail if self.strip_think else '', tail, completed)
+
+    def done(self, **info):
+        return self.event('done', dict(info, prompt=self.prompt, fields=self.parser.fields))
+
+    def finish(self, **info):
+        return self.flush() + self.done(**info)
+
+
+def create_chat_output(fmt=None, strip_think=False):
+    if fmt in ('sse', 'ndjson'):
+        return StructuredOutput(fmt, strip_think)
+    return PlainOutput(strip_think)
+
+
+def requested_format(data, accept):
+    # 请求体中的 format 优先，其次看 Accept 头
+    fmt = (data.get('format') or '').lower()
+    if fmt in ('sse', 'ndjson', 'text'):
+        return fmt
+    accept = (accept or '').lower()
+    if 'text/event-stream' in accept:
+        return 'sse'
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    return 'text'
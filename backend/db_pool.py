@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# 数据库连接池配置、取连接等待时间统计，以及历史记录接口的只读副本路由
+# 主库和只读副本各用一个连接池，/chat 的写入不会和历史记录查询抢同一个池
+import time
+import threading
+from collections import deque
+from functools import wraps
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+
+
+class PoolStats:
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.waits = deque(maxlen=window)
+
+    def record(self, seconds, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.waits.append(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            waits = sorted(self.waits)
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms": {
+                    "p50": wait_percentile_ms(waits, 50),
+                    "p99": wait_percentile_ms(waits, 99),
+                    "max": round(waits[-1] * 1000, 2) if waits else 0.0,
+                },
+            }
+
+
+def wait_percentile_ms(ordered, p):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return round(ordered[index] * 1000, 3)
+
+
+class TimedQueuePool(QueuePool):
+    """记录每次从池中取连接的等待时间（含新建连接），池满等待超时也计入"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # dispose() 重建连接池时保留统计
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def is_memory_sqlite(url):
+    return url.startswith('sqlite') and (url in ('sqlite://', 'sqlite:///') or ':memory:' in url)
+
+
+def engine_options(url, pool_size, max_overflow, pool_timeout, pool_recycle, pool_pre_ping):
+    # 内存 SQLite 由 Flask-SQLAlchemy 使用 StaticPool，不适用连接池参数
+    if is_memory_sqlite(url):
+        return {}
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_recycle": pool_recycle,
+        "pool_pre_ping": pool_pre_ping,
+    }
+
+
+def pool_metrics(engines):
+    metrics = {}
+    for name, engine in engines.items():
+        pool = engine.pool
+        entry = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow(), idle=pool.checkedin())
+        if isinstance(pool, TimedQueuePool):
+            entry.update(pool.stats.snapshot())
+        metrics[name or 'primary'] = entry
+    return metrics
+
+
+def is_replica_safe(clause):
+    # 只有普通 SELECT 可以发到副本；flush 按映射类取连接时不带语句（clause 为 None），
+    # 与 INSERT/UPDATE/DELETE、text() 和 SELECT ... FOR UPDATE 一样走主库
+    return (clause is not None and getattr(clause, 'is_select', False)
+            and getattr(clause, '_for_update_arg', None) is None)
+
+
+class RoutingSession(Session):
+    """标记为只读的会话把查询发到只读副本；写入和 flush 始终走主库，未配置副本时全部走主库"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('read_only') and is_replica_safe(clause):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(db):
+    # 视图装饰器：本次请求的查询走只读副本（副本有复制延迟，只用于历史记录这类允许稍旧数据的接口）
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            db.session.info['read_only'] = True
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
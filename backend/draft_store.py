@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# 草图的临时存储：草图只在完整版生成出来之前给前端占位，不写入消息图片存储，也不进 SD 结果缓存
+# 按写入时间过期，写入新草图时顺带清理过期文件，不需要单独的清理任务
+import os
+import time
+import threading
+
+from blob_store import LocalBlobStore
+
+
+class DraftStore(LocalBlobStore):
+    """本地磁盘上的草图目录，文件写入 ttl 秒后删除"""
+
+    def __init__(self, root, ttl):
+        super().__init__(root)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.last_prune = 0.0
+
+    def put(self, data):
+        result = super().put(data)
+        self._touch(result[0])
+        return result
+
+    def put_stream(self, source, max_size=None):
+        result = super().put_stream(source, max_size=max_size)
+        self._touch(result[0])
+        return result
+
+    def _touch(self, blob_hash):
+        # 相同内容的草图已存在时不会重写文件，从这次写入重新计时
+        try:
+            os.utime(self.path(blob_hash))
+        except FileNotFoundError:
+            pass
+        self.maybe_prune()
+
+    def exists(self, blob_hash):
+        try:
+            return time.time() - os.path.getmtime(self.path(blob_hash)) < self.ttl
+        except FileNotFoundError:
+            return False
+
+    def open(self, blob_hash):
+        # 已过期但还没清理的草图按不存在处理
+        if not self.exists(blob_hash):
+            raise FileNotFoundError(blob_hash)
+        return super().open(blob_hash)
+
+    def maybe_prune(self):
+        # 两次清理至少间隔 ttl 的四分之一
+        now = time.time()
+        with self.lock:
+            if now - self.last_prune < self.ttl / 4:
+                return 0
+            self.last_prune = now
+        return self.prune(now)
+
+    def prune(self, now=None):
+        # 删除过期的草图和写入中断留下的临时文件，返回删除的文件数
+        cutoff = (now or time.time()) - self.ttl
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# 文案和 SD 提示词生成结果的缓存：同一主题重复生成时直接回放之前的结果
+# 键为 (选项, 模板版本, 规范化后的消息) 的哈希，支持 TTL 和 LRU 淘汰，可选落盘
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_message(message):
+    # 全角半角统一、去掉首尾空白、连续空白合并为一个空格
+    text = unicodedata.normalize('NFKC', message or '')
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def cache_key(option, template_version, message):
+    raw = f"{option}\x00{template_version}\x00{normalize_message(message)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DiskBackend:
+    """保存在 sqlite 文件中，多个进程可以共享"""
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS generations ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_generations_last_used ON generations (last_used)")
+
+    def _connect(self):
+        # sqlite 连接不能跨线程使用，每个线程一个
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM generations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            if row[1] < now:
+                conn.execute("DELETE FROM generations WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE generations SET last_used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, value, ttl):
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO generations (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            # 超出上限时淘汰最久未使用的条目
+            conn.execute(
+                "DELETE FROM generations WHERE key IN ("
+                "SELECT key FROM generations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+
+class GenerationCache:
+    def __init__(self, backend, ttl=86400):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0}
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self.lock:
+            self.counters["hits" if value is not None else "misses"] += 1
+        return value
+
+    def set(self, key, value):
+        if not value:
+            return
+        self.backend.set(key, value, self.ttl)
+        with self.lock:
+            self.counters["stores"] += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return dict(
+                self.counters,
+                entries=len(self.backend),
+                hit_rate=round(self.counters["hits"] / lookups, 4) if lookups else 0.0
+            )
+
+
+class ReplayStream:
+    """把缓存的完整回复按小块重新输出，与真实的流式输出走同一条路径"""
+
+    def __init__(self, text, chunk_size=16):
+        self.text = text
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        for i in range(0, len(self.text), self.chunk_size):
+            yield self.text[i:i + self.chunk_size]
+
+    def close(self):
+        pass
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# SD 生成结果缓存：SD 服务使用固定种子，同一提示词和同样的生成参数得到的图片完全相同，命中时不再调用 SD
+# 键为 (规范化提示词, 模型, 种子, 步数, 引导系数, 反向提示词) 的哈希，值为图片在应用图片存储中的哈希；
+# 缓存不另存图片，只在 sqlite 索引（多个进程共享）里记录键到哈希的对应，条目数超过上限时按最近使用时间淘汰索引条目。
+# 图片本身由图片存储管理，淘汰条目不删除图片（消息可能还在引用）
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from gen_cache import normalize_message
+
+
+def normalize_prompt(prompt):
+    # 在文本缓存的规范化基础上统一逗号两侧的空白；CLIP 分词本身不区分大小写，这些差异不影响生成结果
+    return re.sub(r'\s*,\s*', ', ', normalize_message(prompt)).strip(', ')
+
+
+def image_cache_key(prompt, params):
+    raw = json.dumps({"prompt": normalize_prompt(prompt), "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ImageResultCache:
+    def __init__(self, path, store, max_entries):
+        # path 为 sqlite 索引文件，store 为应用的图片存储
+        self.max_entries = max_entries
+        self.store = store
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                "key TEXT PRIMARY KEY, blob_hash TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_images_last_used ON images (last_used)")
+
+    def _connect(self):
+        # sqlite 连接不能跨线程使用，每个线程一个
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self.local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def get(self, key):
+        # 命中时返回 (hash, size)；图片已从图片存储中删除的条目按未命中处理并删除
+        conn = self._connect()
+        row = conn.execute("SELECT blob_hash, size FROM images WHERE key = ?", (key,)).fetchone()
+        if row is not None and not self.store.exists(row[0]):
+            with conn:
+                conn.execute("DELETE FROM images WHERE key = ?", (key,))
+            row = None
+        if row is None:
+            self._count("misses")
+            return None
+        with conn:
+            conn.execute("UPDATE images SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._count("hits")
+        return row[0], row[1]
+
+    def put(self, key, blob_hash, size):
+        # 登记已经写入图片存储的图片
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO images (key, blob_hash, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, blob_hash, size, time.time())
+            )
+        self._count("stores")
+        self._evict()
+
+    def _evict(self):
+        conn = self._connect()
+        excess = conn.execute("SELECT COUNT(*) FROM images").fetchone()[0] - self.max_entries
+        if excess <= 0:
+            return
+        with conn:
+            conn.execute(
+                "DELETE FROM images WHERE key IN (SELECT key FROM images ORDER BY last_used LIMIT ?)", (excess,)
+            )
+        self._count("evictions", excess)
+
+    def stats(self):
+        conn = self._connect()
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images").fetchone()
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return dict(
+                self.counters,
+                entries=entries,
+                bytes=total,
+                max_entries=self.max_entries,
+                hit_rate=round(self.counters["hits"] / lookups, 4) if lookups else 0.0
+            )
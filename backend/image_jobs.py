@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# 背景图生成任务队列：提交后立即返回任务ID，由固定数量的工作线程调用 SD 服务
+# 队列长度和每个用户同时进行的任务数都有上限，支持取消、超时、轮询和 SSE 订阅状态变化
+import time
+import uuid
+import queue
+import threading
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMED_OUT = 'timed_out'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED, TIMED_OUT)
+
+
+class QueueFullError(Exception):
+    """排队任务已达上限"""
+
+
+class UserLimitError(Exception):
+    """该用户进行中的任务已达上限"""
+
+
+class JobCancelled(Exception):
+    """任务执行过程中被取消"""
+
+
+class ImageJob:
+    def __init__(self, user_id, payload, timeout):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.payload = payload
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.deadline = self.created_at + timeout
+        self.expected_seconds = None
+        self.position = None
+        # 每次状态变化 version 加一，SSE 订阅方据此判断是否有新状态
+        self.version = 0
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.time())
+
+    def check_cancelled(self):
+        # 执行函数在耗时操作前后调用，取消后尽早退出
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def progress(self):
+        # SD 服务不回报推理步数，按最近任务的平均耗时估算进度，完成前最多到 0.95
+        if self.status == SUCCEEDED:
+            return 1.0
+        if self.status != RUNNING or not self.expected_seconds:
+            return 0.0
+        return round(min(0.95, (time.time() - self.started_at) / self.expected_seconds), 2)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": self.progress(),
+            "position": self.position if self.status == QUEUED else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": dict(self.result) if self.result else None,
+            "error": self.error,
+        }
+
+
+class ImageJobQueue:
+    def __init__(self, runner, workers=2, max_queued=100, per_user_limit=2, timeout=300.0, retention=600.0):
+        # runner(job) 执行任务并返回结果字典，失败时抛出异常
+        self.runner = runner
+        self.workers = workers
+        self.max_queued = max_queued
+        self.per_user_limit = per_user_limit
+        self.timeout = timeout
+        self.retention = retention
+
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.jobs = {}
+        self.waiting = []
+        self.threads = []
+        self.avg_seconds = None
+        self.counters = {"submitted": 0, "rejected": 0, SUCCEEDED: 0, FAILED: 0, CANCELLED: 0, TIMED_OUT: 0}
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'image-worker-{i}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, user_id, **payload):
+        # 按整数 id 统计每个用户的任务数，字符串和整数形式的同一 id 不会各算各的；无效 id 抛出 ValueError
+        user_id = int(user_id)
+        self.start()
+        with self.lock:
+            self._prune()
+            if len(self.waiting) >= self.max_queued:
+                self.counters["rejected"] += 1
+                raise QueueFullError("图片生成队列已满")
+            active = sum(1 for job in self.jobs.values() if job.user_id == user_id and not job.finished)
+            if active >= self.per_user_limit:
+                self.counters["rejected"] += 1
+                raise UserLimitError("进行中的图片任务过多")
+            job = ImageJob(user_id, payload, self.timeout)
+            self.jobs[job.id] = job
+            self.waiting.append(job)
+            self.counters["submitted"] += 1
+            self._update_positions()
+        self.queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        # 排队中的任务直接结束；执行中的任务设置取消标记，SD 调用返回后丢弃结果
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED, error="任务已取消")
+            return job
+
+    def snapshot(self, job):
+        with self.lock:
+            return job.version, job.to_dict()
+
+    def wait(self, job, version, timeout=15.0):
+        # 等待任务状态变化，超时返回 None（SSE 据此发送心跳）
+        with self.changed:
+            self.changed.wait_for(lambda: job.version != version, timeout=timeout)
+            if job.version == version:
+                return None
+            return job.version, job.to_dict()
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            with self.lock:
+                if job in self.waiting:
+                    self.waiting.remove(job)
+                    self._update_positions()
+                if job.finished:
+                    continue
+                if job.remaining() <= 0:
+                    self._finish(job, TIMED_OUT, error="排队超时")
+                    continue
+                job.status = RUNNING
+                job.started_at = time.time()
+                job.expected_seconds = self.avg_seconds
+                self._changed(job)
+
+            try:
+                result = self.runner(job)
+                job.check_cancelled()
+            except JobCancelled:
+                self._complete(job, CANCELLED, error="任务已取消")
+            except TimeoutError:
+                self._complete(job, TIMED_OUT, error="图片生成超时")
+            except Exception as e:
+                print(f"图片任务失败：{str(e)}")
+                self._complete(job, FAILED, error=str(e) or "图片生成失败")
+            else:
+                self._complete(job, SUCCEEDED, result=result)
+
+    def _complete(self, job, status, result=None, error=None):
+        with self.lock:
+            if status == SUCCEEDED:
+                elapsed = time.time() - job.started_at
+                # 指数滑动平均，用于估算下一个任务的进度
+                self.avg_seconds = elapsed if self.avg_seconds is None else 0.8 * self.avg_seconds + 0.2 * elapsed
+            if not job.finished:
+                self._finish(job, status, result=result, error=error)
+
+    def _finish(self, job, status, result=None, error=None):
+        # 调用方持有锁
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        self.counters[status] += 1
+        if job in self.waiting:
+            self.waiting.remove(job)
+            self._update_positions()
+        self._changed(job)
+
+    def _changed(self, job):
+        job.version += 1
+        self.changed.notify_all()
+
+    def _update_positions(self):
+        for position, job in enumerate(self.waiting):
+            if job.position != position:
+                job.position = position
+                self._changed(job)
+
+    def _prune(self):
+        # 清理结束超过保留时间的任务
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def stats(self):
+        with self.lock:
+            running = sum(1 for job in self.jobs.values() if job.status == RUNNING)
+            return dict(
+                self.counters,
+                queued=len(self.waiting),
+                running=running,
+                avg_ms=round(self.avg_seconds * 1000, 2) if self.avg_seconds else 0.0
+            )
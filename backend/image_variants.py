@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# 图片的缩略图和 WebP/JPEG 转码版本：第一次请求时由工作线程池生成，之后从磁盘缓存读取
+# 缓存键为 (图片哈希, 尺寸, 格式)，总大小超过上限时按最近使用时间淘汰；原图仍只保存在图片存储中
+import io
+import os
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from instrumentation import record_stage
+
+# 格式名 -> (Pillow 格式, MIME 类型)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+}
+
+
+def variant_name(image_hash, width, fmt):
+    return f"{image_hash}-{width}.{fmt}"
+
+
+def encode_variant(image, width, fmt, quality=80):
+    # 按最长边缩小到 width（不放大），再编码为目标格式
+    image = image.copy()
+    image.thumbnail((width, width), Image.LANCZOS)
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        # JPEG 不支持透明通道，透明部分铺白底
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA')
+    options = {'quality': quality} if fmt in ('webp', 'jpeg') else {'optimize': True}
+    buffer = io.BytesIO()
+    image.save(buffer, format=FORMATS[fmt][0], **options)
+    return buffer.getvalue()
+
+
+class VariantCache:
+    """磁盘上的变体文件，路径为 root/ab/<名称>；重启后按文件修改时间恢复 LRU 顺序"""
+
+    def __init__(self, root, max_bytes):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # 名称 -> 文件大小，按最近使用排序
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        found = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                stat = os.stat(os.path.join(directory, name))
+                found.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(found):
+            self.entries[name] = size
+            self.total_bytes += size
+        self._evict()
+
+    def path(self, name):
+        return os.path.join(self.root, name[:2], name)
+
+    def __contains__(self, name):
+        with self.lock:
+            return name in self.entries
+
+    def get(self, name):
+        # 命中时返回文件路径并更新使用时间
+        with self.lock:
+            if name not in self.entries:
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(name)
+            self.counters["hits"] += 1
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # 文件被外部删除
+            with self.lock:
+                size = self.entries.pop(name, None)
+                if size is not None:
+                    self.total_bytes -= size
+            return None
+        return path
+
+    def put(self, name, data):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop(name, 0)
+            self.entries[name] = len(data)
+            self.counters["stores"] += 1
+            self._evict()
+        return path
+
+    def _evict(self):
+        # 至少保留刚写入的一项，单个文件超过上限时也能返回
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            name, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.counters["evictions"] += 1
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries), bytes=self.total_bytes, max_bytes=self.max_bytes)
+
+
+class ImageVariants:
+    def __init__(self, blob_store, cache, workers=2, widths=(96, 160, 320, 640, 1280), quality=80):
+        self.blob_store = blob_store
+        self.cache = cache
+        self.widths = tuple(sorted(widths))
+        self.quality = quality
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-variant')
+        self.lock = threading.Lock()
+        # 正在生成的变体，同一变体的并发请求共用一次编码
+        self.pending = {}
+
+    def normalize_width(self, width):
+        # 尺寸取不小于请求值的最小档位，限制缓存中的变体数量
+        for allowed in self.widths:
+            if width <= allowed:
+                return allowed
+        return self.widths[-1]
+
+    def open(self, image_hash, width, fmt, timeout=None):
+        # 返回变体的只读文件对象；图片不存在时抛出 FileNotFoundError，无法解码时抛出 ValueError
+        name = variant_name(image_hash, width, fmt)
+        for _ in range(2):
+            path = self.cache.get(name) or self.submit(image_hash, width, fmt).result(timeout)
+            try:
+                return open(path, 'rb')
+            except FileNotFoundError:
+                # 刚好被淘汰，重新生成一次
+                continue
+        raise FileNotFoundError(name)
+
+    def submit(self, image_hash, width, fmt):
+        name = variant_name(image_hash, width, fmt)
+        with self.lock:
+            future = self.pending.get(name)
+            if future is not None:
+                return future
+            future = self.executor.submit(self._render, image_hash, width, fmt, name)
+            self.pending[name] = future
+        # 已完成的任务会立即调用回调，不能在持有锁时添加
+        future.add_done_callback(lambda _: self._finished(name))
+        return future
+
+    def prefetch(self, image_hash, width, fmt):
+        # 历史记录返回前预先排队生成缩略图，不等待结果
+        if variant_name(image_hash, width, fmt) not in self.cache and self.blob_store.exists(image_hash):
+            self.submit(image_hash, width, fmt)
+
+    def _finished(self, name):
+        with self.lock:
+            self.pending.pop(name, None)
+
+    def _render(self, image_hash, width, fmt, name):
+        start = time.perf_counter()
+        with self.blob_store.open(image_hash) as f:
+            try:
+                image = Image.open(f)
+                image.load()
+            except (OSError, Image.DecompressionBombError) as e:
+                raise ValueError(f"无法解码图片：{str(e)}")
+        data = encode_variant(image, width, fmt, self.quality)
+        path = self.cache.put(name, data)
+        record_stage('image_variant_render', time.perf_counter() - start)
+        return path
+
+    def stats(self):
+        with self.lock:
+            pending = len(self.pending)
+        return dict(self.cache.stats(), pending=pending)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
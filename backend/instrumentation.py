@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+# 请求级埋点：每个请求记录各阶段耗时（数据库提交、首个 token、SD 调用等）和 SQL 查询次数，
+# 汇总成直方图，以 Prometheus 文本格式从 /metrics 导出
+# 可选的采样分析器：请求期间定时抓取处理线程的调用栈，慢请求结束后写出折叠栈文件（flamegraph.pl / speedscope 可直接读取）
+import os
+import sys
+import time
+import threading
+import contextvars
+from collections import deque, Counter
+from contextlib import contextmanager
+
+# 秒为单位的默认分桶，覆盖 1ms 到 1 分钟
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+RATE_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500)
+
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class CounterMetric:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f'{self.name}{format_labels(self.labels, key)} {format_value(value)}' for key, value in items]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # 每组标签：[各桶计数..., 总和, 总数]
+        self.series = {}
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self.lock:
+            items = sorted((key, list(series)) for key, series in self.series.items())
+        lines = []
+        names = self.labels + ('le',)
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(names, key + (format_value(bound),))} {cumulative}')
+            lines.append(f'{self.name}_bucket{format_labels(names, key + ("+Inf",))} {series[-1]}')
+            lines.append(f'{self.name}_sum{format_labels(self.labels, key)} {format_value(series[-2])}')
+            lines.append(f'{self.name}_count{format_labels(self.labels, key)} {series[-1]}')
+        return lines
+
+
+class GaugeCallback:
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels, collect):
+        # collect() 返回 {标签值元组: 数值}，抓取时调用
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def render(self):
+        try:
+            items = sorted(self.collect().items())
+        except Exception as e:
+            print(f"采集指标 {self.name} 失败：{str(e)}")
+            return []
+        return [f'{self.name}{format_labels(self.labels, key)} {format_value(value)}' for key, value in items]
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(CounterMetric(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, labels, collect):
+        return self.register(GaugeCallback(name, help_text, labels, collect))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+request_seconds = registry.histogram('http_request_duration_seconds', '请求耗时（流式响应算到流结束）', ('endpoint', 'method', 'status'))
+request_queries = registry.histogram('http_request_db_queries', '每个请求执行的 SQL 语句数', ('endpoint',), buckets=COUNT_BUCKETS)
+stage_seconds = registry.histogram('stage_duration_seconds', '各阶段耗时', ('stage',))
+db_queries = registry.counter('db_queries_total', '执行的 SQL 语句总数', ('endpoint',))
+chat_tokens = registry.counter('chat_stream_chunks_total', '/chat 转发的增量片段总数', ('source',))
+chat_token_rate = registry.histogram('chat_stream_chunks_per_second', '/chat 首个片段之后的生成速度（片段/秒）', buckets=RATE_BUCKETS)
+
+
+class Trace:
+    def __init__(self, endpoint, method='', thread_id=None):
+        self.endpoint = endpoint or 'unknown'
+        self.method = method
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.stages = {}
+        self.marks = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.thread_id = thread_id
+        self.samples = Counter()
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def mark(self, name):
+        # 记录从请求开始到某个时刻的耗时（如首个 token），同一标记只记第一次
+        if name not in self.marks:
+            elapsed = time.perf_counter() - self.started
+            self.marks[name] = elapsed
+            stage_seconds.observe(elapsed, name)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        # Server-Timing 响应头，浏览器开发者工具可直接展示
+        parts = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items()]
+        parts += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.marks.items()]
+        parts.append(f'db;desc="{self.queries} queries";dur={self.query_seconds * 1000:.1f}')
+        return ', '.join(parts)
+
+    def to_dict(self, status=None):
+        return {
+            "endpoint": self.endpoint,
+            "method": self.method,
+            "status": status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.elapsed() * 1000, 2),
+            "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+            "marks_ms": {name: round(seconds * 1000, 2) for name, seconds in self.marks.items()},
+            "db_queries": self.queries,
+            "db_ms": round(self.query_seconds * 1000, 2),
+        }
+
+
+def record_stage(name, seconds):
+    # 写入阶段直方图，有当前请求时同时记到请求上
+    stage_seconds.observe(seconds, name)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_stage(name, seconds)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def mark(name):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.mark(name)
+
+
+def record_stream_rate(chunks, first_at, last_at, source):
+    chat_tokens.inc(source, amount=chunks)
+    if chunks > 1 and last_at > first_at:
+        chat_token_rate.observe((chunks - 1) / (last_at - first_at))
+
+
+class SamplingProfiler:
+    """按固定间隔抓取正在处理请求的线程的调用栈；只在有请求登记时运行"""
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.lock = threading.Lock()
+        self.active = {}
+        self.thread = None
+
+    def attach(self, trace):
+        with self.lock:
+            self.active[trace.thread_id] = trace
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self.thread.start()
+
+    def detach(self, trace):
+        with self.lock:
+            if self.active.get(trace.thread_id) is trace:
+                del self.active[trace.thread_id]
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.active:
+                    self.thread = None
+                    return
+                active = dict(self.active)
+            frames = sys._current_frames()
+            for thread_id, trace in active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    trace.samples[self.collapse(frame)] += 1
+
+    def collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+
+class Instrumentation:
+    def __init__(self, profile_dir=None, slow_seconds=0.0, profile_interval=0.005, recent=200):
+        # slow_seconds > 0 时开启采样分析，耗时超过阈值的请求写出折叠栈到 profile_dir
+        self.profile_dir = profile_dir
+        self.slow_seconds = slow_seconds
+        self.profiler = SamplingProfiler(profile_interval) if slow_seconds > 0 else None
+        self.recent = deque(maxlen=recent)
+        self.lock = threading.Lock()
+
+    def begin(self, endpoint, method='', profile=True):
+        trace = Trace(endpoint, method, threading.get_ident())
+        if self.profiler and profile:
+            self.profiler.attach(trace)
+        token = current_trace.set(trace)
+        return trace, token
+
+    def finish(self, trace, token, status=None):
+        if self.profiler:
+            self.profiler.detach(trace)
+        try:
+            current_trace.reset(token)
+        except ValueError:
+            # 流式响应可能在另一个上下文中结束
+            pass
+        seconds = trace.elapsed()
+        request_seconds.observe(seconds, trace.endpoint, trace.method, str(status))
+        request_queries.observe(trace.queries, trace.endpoint)
+        record = trace.to_dict(status)
+        if self.profiler and seconds >= self.slow_seconds and trace.samples:
+            record["profile"] = self.write_profile(trace, seconds)
+        with self.lock:
+            self.recent.append(record)
+        return record
+
+    def write_profile(self, trace, seconds):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{trace.endpoint}-{int(seconds * 1000)}ms-{trace.thread_id}.folded"
+        path = os.path.join(self.profile_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in trace.samples.most_common():
+                f.write(f'{stack} {count}\n')
+        return name
+
+    def recent_requests(self, limit=50, slowest=False):
+        with self.lock:
+            records = list(self.recent)
+        if slowest:
+            records.sort(key=lambda record: record["duration_ms"], reverse=True)
+        else:
+            records.reverse()
+        return records[:limit]
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    trace = current_trace.get()
+    context._query_started = time.perf_counter()
+    db_queries.inc(trace.endpoint if trace is not None else 'background')
+    if trace is not None:
+        trace.queries += 1
+
+
+def time_query(conn, cursor, statement, parameters, context, executemany):
+    trace = current_trace.get()
+    started = getattr(context, '_query_started', None)
+    if trace is not None and started is not None:
+        trace.query_seconds += time.perf_counter() - started
+
+
+def commit_started(session):
+    session.info['_commit_started'] = time.perf_counter()
+
+
+def commit_finished(session):
+    # 提交耗时包含提交前的 flush
+    started = session.info.pop('_commit_started', None)
+    if started is not None:
+        record_stage('db_commit', time.perf_counter() - started)
+
+
+def commit_abandoned(session):
+    session.info.pop('_commit_started', None)
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+# 进程内共享的上游客户端：DeepSeek（OpenAI 兼容接口）和 Stable Diffusion 服务
+# 复用连接池和 keep-alive，统一并发上限、超时、带抖动的指数退避重试，并记录每个上游的延迟
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+
+# openai 3.x 的 HTTP 客户端基于 httpx2，超时和连接池配置必须用同一个库的类型，传 httpx 的对象不会生效
+import httpx2
+import requests
+from requests.adapters import HTTPAdapter
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+
+
+class UpstreamBusyError(Exception):
+    """上游并发已满，在等待时间内没有拿到名额"""
+
+
+class NoWorkerAvailable(UpstreamBusyError):
+    """没有可用的 SD 实例"""
+
+
+class UpstreamStats:
+    """单个上游的调用次数、错误数和延迟分布（保留最近的样本用于计算分位数）"""
+
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.in_flight = 0
+        self.recent = deque(maxlen=window)
+
+    def record(self, seconds, error=False):
+        with self.lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            self.recent.append(seconds)
+            if error:
+                self.errors += 1
+
+    def snapshot(self):
+        with self.lock:
+            recent = sorted(self.recent)
+            count = self.count
+
+            def pct(p):
+                if not recent:
+                    return 0.0
+                return round(recent[min(len(recent) - 1, int(p / 100 * len(recent)))] * 1000, 2)
+
+            return {
+                "count": count,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "avg_ms": round(self.total_seconds / count * 1000, 2) if count else 0.0,
+                "p50_ms": pct(50),
+                "p99_ms": pct(99),
+                "max_ms": round(self.max_seconds * 1000, 2),
+            }
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    # 指数退避 + full jitter，避免重试请求同时打到上游
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ManagedStream:
+    """包装流式响应，读完或 close() 时释放并发名额（只释放一次）"""
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def __iter__(self):
+        try:
+            for chunk in self.stream:
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        try:
+            self.stream.close()
+        finally:
+            self.release()
+
+
+class AsyncManagedStream:
+    """ManagedStream 的异步版本：读完或 await close() 时关闭上游流并释放并发名额（只释放一次）"""
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+        self.closed = False
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self.stream:
+                yield chunk
+        finally:
+            await self.close()
+
+    async def close(self):
+        # 只在事件循环线程上调用，不需要加锁
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self.stream.close()
+        finally:
+            self.release()
+
+
+class LLMClientManager:
+    def __init__(self, api_key, base_url, sd_pool=None, max_connections=100, max_concurrency=64,
+                 timeout=60.0, connect_timeout=10.0, max_retries=2, http2=True,
+                 sd_timeout=120.0, sd_max_retries=2, sd_max_concurrency=4, acquire_timeout=30.0):
+        self.api_key = api_key
+        self.base_url = base_url
+        # SD 实例注册表（sd_pool.SDWorkerPool），负责选择实例和健康状态
+        self.sd_pool = sd_pool
+        self.max_connections = max_connections
+        self.timeout = httpx2.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        # 没装 h2 时退回 HTTP/1.1
+        self.http2 = http2 and http2_available()
+        self.sd_timeout = (connect_timeout, sd_timeout)
+        self.sd_max_retries = sd_max_retries
+        self.acquire_timeout = acquire_timeout
+
+        self.semaphores = {
+            'deepseek': threading.BoundedSemaphore(max_concurrency),
+            'stable_diffusion': threading.BoundedSemaphore(sd_max_concurrency),
+        }
+        self.stats = {name: UpstreamStats() for name in self.semaphores}
+
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_client = None
+        self._session = None
+
+    def _limits(self):
+        return httpx2.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+
+    @property
+    def client(self):
+        # 懒加载，第一次调用时才建立连接池
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        max_retries=self.max_retries,  # SDK 自带带抖动的指数退避
+                        timeout=self.timeout,
+                        http_client=DefaultHttpxClient(limits=self._limits(), http2=self.http2, timeout=self.timeout)
+                    )
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = AsyncOpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        max_retries=self.max_retries,
+                        timeout=self.timeout,
+                        http_client=DefaultAsyncHttpxClient(limits=self._limits(), http2=self.http2, timeout=self.timeout)
+                    )
+        return self._async_client
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_connections)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def _acquire(self, upstream, timeout=None):
+        timeout = self.acquire_timeout if timeout is None else min(timeout, self.acquire_timeout)
+        if not self.semaphores[upstream].acquire(timeout=timeout):
+            raise UpstreamBusyError(f"{upstream} 并发已满")
+        self._acquired(upstream)
+
+    async def _acquire_async(self, upstream):
+        # 与同步路径共用同一个信号量，两条路径合计不超过上游并发上限；
+        # 名额已满时在事件循环上短暂轮询，不占用线程池里的线程
+        semaphore = self.semaphores[upstream]
+        deadline = time.monotonic() + self.acquire_timeout
+        delay = 0.005
+        while not semaphore.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                raise UpstreamBusyError(f"{upstream} 并发已满")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        self._acquired(upstream)
+
+    def _acquired(self, upstream):
+        stats = self.stats[upstream]
+        with stats.lock:
+            stats.in_flight += 1
+
+    def _release(self, upstream):
+        stats = self.stats[upstream]
+        with stats.lock:
+            stats.in_flight -= 1
+        self.semaphores[upstream].release()
+
+    @contextmanager
+    def slot(self, upstream, timeout=None):
+        # 占用一个上游并发名额，并记录这次调用的耗时；timeout 为等待名额的最长时间，不超过 acquire_timeout
+        self._acquire(upstream, timeout)
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.stats[upstream].record(time.perf_counter() - start, error)
+            self._release(upstream)
+
+    def chat_completion(self, **kwargs):
+        with self.slot('deepseek'):
+            return self.client.chat.completions.create(**kwargs)
+
+    def stream_chat_completion(self, **kwargs):
+        # 建立流时记录延迟；并发名额一直占用到流被读完或关闭
+        self._acquire('deepseek')
+        start = time.perf_counter()
+        try:
+            stream = self.client.chat.completions.create(stream=True, **kwargs)
+        except Exception:
+            self.stats['deepseek'].record(time.perf_counter() - start, error=True)
+            self._release('deepseek')
+            raise
+        self.stats['deepseek'].record(time.perf_counter() - start)
+        return ManagedStream(stream, lambda: self._release('deepseek'))
+
+    @asynccontextmanager
+    async def async_slot(self, upstream):
+        # slot 的异步版本，占用同一个并发名额
+        await self._acquire_async(upstream)
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.stats[upstream].record(time.perf_counter() - start, error)
+            self._release(upstream)
+
+    async def async_chat_completion(self, **kwargs):
+        async with self.async_slot('deepseek'):
+            return await self.async_client.chat.completions.create(**kwargs)
+
+    async def async_stream_chat_completion(self, **kwargs):
+        # 与 stream_chat_completion 相同：建立流时记录延迟，并发名额一直占用到流被读完或关闭
+        await self._acquire_async('deepseek')
+        start = time.perf_counter()
+        try:
+            stream = await self.async_client.chat.completions.create(stream=True, **kwargs)
+        except BaseException:
+            self.stats['deepseek'].record(time.perf_counter() - start, error=True)
+            self._release('deepseek')
+            raise
+        self.stats['deepseek'].record(time.perf_counter() - start)
+        return AsyncManagedStream(stream, lambda: self._release('deepseek'))
+
+    def sd_post(self, path, deadline=None, **kwargs):
+        # 调用 SD 服务：每次发给进行中请求最少的健康实例，连接失败（含连接超时）和 502/503/504 时立即换一个实例重试，
+        # 所有实例都失败过后再按退避从头轮换
+        # 读超时不重试：请求已经送达，实例可能仍在生成，换实例重来只会让调用方等上几倍的超时时间
+        # deadline 为整个调用的截止时间（time.time()），等待名额、退避和每次尝试的超时都不超过剩余时间，到期抛出 requests.Timeout
+        timeout = kwargs.pop('timeout', self.sd_timeout)
+        if not isinstance(timeout, tuple):
+            timeout = (timeout, timeout)
+        headers = kwargs.pop('headers', {})
+        headers.setdefault("ngrok-skip-browser-warning", "122131")
+
+        def remaining():
+            if deadline is None:
+                return None
+            left = deadline - time.time()
+            if left <= 0:
+                raise requests.Timeout("SD 请求超过截止时间")
+            return left
+
+        with self.slot('stable_diffusion', remaining()):
+            tried = set()
+            for attempt in range(self.sd_max_retries + 1):
+                last = attempt == self.sd_max_retries
+                try:
+                    worker = self.sd_pool.acquire(exclude=tried)
+                except NoWorkerAvailable:
+                    if not tried:
+                        raise
+                    tried.clear()
+                    delay = backoff_delay(attempt)
+                    left = remaining()
+                    time.sleep(delay if left is None else min(delay, left))
+                    worker = self.sd_pool.acquire()
+                left = remaining()
+                attempt_timeout = timeout if left is None else tuple(left if t is None else min(t, left) for t in timeout)
+                start = time.perf_counter()
+                failed = True
+                try:
+                    response = self.session.post(worker.url + path, headers=headers, timeout=attempt_timeout, **kwargs)
+                    failed = response.status_code in (502, 503, 504)
+                    if not failed or last:
+                        return response
+                    # 流式请求的响应不读完不会归还连接，重试前先关闭
+                    response.close()
+                except requests.ConnectionError:
+                    # ConnectTimeout 同时是 ConnectionError，在这里重试；ReadTimeout 直接抛出
+                    if last:
+                        raise
+                finally:
+                    self.sd_pool.release(worker, time.perf_counter() - start, error=failed)
+                tried.add(worker.url)
+
+    def metrics(self):
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+        if self._session is not None:
+            self._session.close()
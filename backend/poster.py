@@ -0,0 +1,549 @@
+# -*- coding: utf-8 -*-
+# 服务端海报合成：把 extract_info 提取的文案按布局模板绘制到背景图上
+# 移植自前端 layoutUtils.analyzeImage / imageService.addTextToImage / findNonOverlappingPosition，
+# 区域亮度和颜色统计使用积分图，任意矩形的均值 O(1) 得到，结果按图片哈希缓存
+import os
+import io
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'poster_templates.json'), encoding='utf-8') as f:
+    # 与 frontend/src/config/layoutTemplates.js 保持一致
+    LAYOUT_TEMPLATES = json.load(f)
+
+# extract_info 的字段与前端文本元素的对应关系，顺序即绘制优先级
+FIELD_KEYS = [
+    ("主题凝练", "mainTitle"),
+    ("震撼标语", "slogan"),
+    ("分层文案-主", "mainText"),
+    ("分层文案-副", "subText"),
+    ("分层文案-数据", "dataText"),
+]
+
+# 常见的中文字体位置，可用 POSTER_FONT / POSTER_BOLD_FONT 指定
+FONT_CANDIDATES = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+]
+BOLD_FONT_CANDIDATES = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Bold.ttc",
+    "C:/Windows/Fonts/msyhbd.ttc",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+]
+
+
+def find_font(env_name, candidates):
+    path = os.getenv(env_name)
+    if path and os.path.exists(path):
+        return path
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+REGULAR_FONT = find_font('POSTER_FONT', FONT_CANDIDATES)
+BOLD_FONT = find_font('POSTER_BOLD_FONT', BOLD_FONT_CANDIDATES) or REGULAR_FONT
+
+
+@lru_cache(maxsize=256)
+def load_font(size, bold=False):
+    path = BOLD_FONT if bold else REGULAR_FONT
+    size = max(1, int(round(size)))
+    if path is None:
+        return ImageFont.load_default(size)
+    return ImageFont.truetype(path, size)
+
+
+# ---------- 区域统计 ----------
+class RegionStats:
+    """图片的积分图（R、G、B 及三者之和），用于快速计算任意矩形区域的平均颜色和亮度"""
+
+    def __init__(self, image):
+        rgb = np.asarray(image.convert('RGB'), dtype=np.uint32)
+        self.height, self.width = rgb.shape[:2]
+        channels = np.concatenate([rgb, rgb.sum(axis=2, keepdims=True)], axis=2)
+        # 累加和不超过 uint32 时用 uint32，节省缓存占用
+        dtype = np.uint32 if self.width * self.height * 765 < 2 ** 32 else np.uint64
+        self.table = np.zeros((self.height + 1, self.width + 1, 4), dtype=dtype)
+        self.table[1:, 1:] = channels.cumsum(axis=0, dtype=dtype).cumsum(axis=1, dtype=dtype)
+
+    def means(self, boxes):
+        # boxes: N×4 的 (left, top, right, bottom)，返回 N×4 的 (r, g, b, brightness)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        left = np.clip(np.floor(boxes[:, 0]), 0, self.width).astype(np.intp)
+        top = np.clip(np.floor(boxes[:, 1]), 0, self.height).astype(np.intp)
+        right = np.clip(np.ceil(boxes[:, 2]), 0, self.width).astype(np.intp)
+        bottom = np.clip(np.ceil(boxes[:, 3]), 0, self.height).astype(np.intp)
+        right = np.maximum(right, left + 1).clip(max=self.width)
+        bottom = np.maximum(bottom, top + 1).clip(max=self.height)
+        left = np.minimum(left, right - 1)
+        top = np.minimum(top, bottom - 1)
+
+        t = self.table
+        corner = lambda ys, xs: t[ys, xs].astype(np.int64)
+        sums = corner(bottom, right) - corner(top, right) - corner(bottom, left) + corner(top, left)
+        area = ((right - left) * (bottom - top))[:, None]
+        result = sums / area
+        result[:, 3] = result[:, 3] / 3 / 255  # 简化的亮度计算，与前端一致
+        return result
+
+    def brightness(self, box):
+        return float(self.means([box])[0, 3])
+
+
+def analyze_image(stats):
+    # 3×3 区域的平均亮度和颜色，结构与前端 analyzeImage 的返回值相同
+    w, h = stats.width, stats.height
+    regions = [
+        {"x": col * w / 3, "y": row * h / 3, "width": w / 3, "height": h / 3}
+        for row in range(3) for col in range(3)
+    ]
+    values = stats.means([[r["x"], r["y"], r["x"] + r["width"], r["y"] + r["height"]] for r in regions])
+    region_analysis = [
+        {
+            "region": region,
+            "avgBrightness": float(v[3]),
+            "avgColor": {"r": float(v[0]), "g": float(v[1]), "b": float(v[2])},
+            "suitForDarkText": bool(v[3] > 0.6),
+        }
+        for region, v in zip(regions, values)
+    ]
+    overall = float(values[:, 3].mean())
+    # 亮度越接近极值（0或1）越适合作为文本背景
+    suitable = sorted(range(9), key=lambda i: -max(values[i, 3], 1 - values[i, 3]))
+    return {
+        "size": {"width": w, "height": h},
+        "overallBrightness": overall,
+        "regionAnalysis": region_analysis,
+        "suitableRegions": suitable,
+        "isDarkImage": overall < 0.5,
+    }
+
+
+class RegionStatsCache:
+    """按图片哈希缓存积分图和分析结果（LRU）"""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0}
+
+    def get(self, image_hash, image):
+        with self.lock:
+            entry = self.entries.get(image_hash)
+            if entry is not None:
+                self.entries.move_to_end(image_hash)
+                self.counters["hits"] += 1
+                return entry
+            self.counters["misses"] += 1
+        stats = RegionStats(image)
+        entry = (stats, analyze_image(stats))
+        with self.lock:
+            self.entries[image_hash] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries))
+
+
+# ---------- 布局 ----------
+def template_layout(template_id, width, height):
+    # 对应前端 getLayoutConfig
+    template = LAYOUT_TEMPLATES.get(template_id) or LAYOUT_TEMPLATES['classic']
+    defaults = {
+        "mainTitle": ('bold', 0.8, 3), "slogan": ('bold', 0.7, 3),
+        "mainText": ('normal', 0.6, 2), "subText": ('normal', 0.6, 2), "dataText": ('normal', 0.6, 1),
+    }
+    layout = {}
+    for key, (weight, max_width, stroke) in defaults.items():
+        config = template[key]
+        layout[key] = {
+            "x": width * config["relativeX"],
+            "y": height * config["relativeY"],
+            "fontSize": min(width * config["fontSizeRatio"], config["maxFontSize"]),
+            "fontWeight": config.get("fontWeight", weight),
+            "textAlign": config.get("textAlign", 'center'),
+            "fontStyle": config.get("fontStyle", 'italic' if key == 'dataText' else 'normal'),
+            "maxWidth": width * config.get("maxWidth", max_width),
+            "opacity": config.get("opacity", 1),
+            "textTransform": config.get("textTransform", 'none'),
+            "strokeWidth": config.get("strokeWidth", stroke),
+        }
+    return layout
+
+
+def optimal_text_positions(analysis, parts):
+    # 对应前端 findOptimalTextPositions
+    width, height = analysis["size"]["width"], analysis["size"]["height"]
+    elements = [
+        ("mainTitle", [1, 4, 7], -0.1),
+        ("slogan", [1, 4], 0.05),
+        ("mainText", [4, 7], 0),
+        ("subText", [7], 0),
+        ("dataText", [7, 8], 0.1),
+    ]
+    assigned = set()
+    positions = {}
+    for key, preferred, y_offset in elements:
+        if not parts.get(key):
+            continue
+        index = next((i for i in preferred if i not in assigned), None)
+        if index is None:
+            index = next((i for i in analysis["suitableRegions"] if i not in assigned), None)
+        if index is None:
+            positions[key] = {"x": width / 2, "y": height / 2 + height * y_offset}
+            continue
+        assigned.add(index)
+        region = analysis["regionAnalysis"][index]["region"]
+        positions[key] = {
+            "x": region["x"] + region["width"] / 2,
+            "y": region["y"] + region["height"] / 2 + height * y_offset,
+        }
+    return positions
+
+
+def auto_layout(analysis, parts):
+    # 对应前端 autoLayoutText
+    width, height = analysis["size"]["width"], analysis["size"]["height"]
+    positions = optimal_text_positions(analysis, parts)
+    base = min(width, height) * 0.04
+    specs = {
+        "mainTitle": (0.2, 2, 'bold', 0.8, 'normal'),
+        "slogan": (0.35, 1.5, 'bold', 0.7, 'normal'),
+        "mainText": (0.5, 1.2, 'normal', 0.6, 'normal'),
+        "subText": (0.65, 1, 'normal', 0.6, 'normal'),
+        "dataText": (0.8, 0.8, 'normal', 0.7, 'italic'),
+    }
+    stroke = 2 if not analysis["isDarkImage"] else 3
+    layout = {}
+    for key, (rel_y, scale, weight, max_width, font_style) in specs.items():
+        position = positions.get(key) or {"x": width * 0.5, "y": height * rel_y}
+        font_size = base * scale
+        text = parts.get(key) or ''
+        if len(text) > 30:
+            # 长文本减小字体大小
+            font_size *= min(1, 30 / len(text))
+        layout[key] = {
+            "x": position["x"], "y": position["y"], "fontSize": font_size,
+            "fontWeight": weight, "textAlign": 'center', "fontStyle": font_style,
+            "maxWidth": width * max_width, "opacity": 1, "textTransform": 'none', "strokeWidth": stroke,
+        }
+    return layout
+
+
+# ---------- 文字排版 ----------
+PRIMARY_BREAKS = '。！？；：…'
+SECONDARY_BREAKS = '，,。；;：:！!?？年月日%、）)]》」"\' '
+
+
+def text_width(font, text):
+    return font.getlength(text)
+
+
+def truncate_text(text, max_width, font):
+    if not text or text_width(font, text) <= max_width:
+        return text
+    available = max_width - text_width(font, '...')
+    if available <= 0:
+        return '...'
+    # 二分查找截断位置
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high) // 2
+        if text_width(font, text[:mid]) <= available:
+            low = mid + 1
+        else:
+            high = mid
+    return text[:max(0, low - 1)] + '...'
+
+
+def wrap_text(text, font, max_width, text_type):
+    # 对应前端 enhancedTextWrapping：优先在标点处断行，其次按单词，最后逐字
+    if not text or len(text) <= 1 or text_width(font, text) <= max_width:
+        return [text]
+
+    chinese = sum(1 for c in text if '\u4e00' <= c <= '\u9fa5')
+    if (text_type == 'dataText' or chinese > len(text) * 0.5) and len(text) > 15:
+        for point in PRIMARY_BREAKS:
+            index = text.find(point)
+            if 0 < index < len(text) - 1 and text_width(font, text[:index + 1]) <= max_width:
+                return [text[:index + 1]] + wrap_text(text[index + 1:], font, max_width, text_type)
+        best = -1
+        best_width = 0
+        for index, c in enumerate(text[:-1]):
+            if c in SECONDARY_BREAKS:
+                width = text_width(font, text[:index + 1])
+                if best_width < width <= max_width:
+                    best, best_width = index, width
+        if best != -1:
+            return [text[:best + 1]] + wrap_text(text[best + 1:], font, max_width, text_type)
+
+    if ' ' in text:
+        lines = []
+        current = ''
+        for word in text.split(' '):
+            candidate = f"{current} {word}" if current else word
+            if text_width(font, candidate) > max_width and current:
+                lines.append(current)
+                current = word
+            else:
+                current = candidate
+        return lines + ([current] if current else [])
+
+    lines = []
+    current = ''
+    for c in text:
+        if text_width(font, current + c) > max_width and current:
+            lines.append(current)
+            current = c
+        else:
+            current += c
+    return lines + ([current] if current else [])
+
+
+class PlacedText:
+    def __init__(self, key, lines, style, font):
+        self.key = key
+        self.lines = lines
+        self.style = style
+        self.font = font
+        self.line_height = style["fontSize"] * 1.2
+        self.width = max(text_width(font, line) for line in lines) if lines else 0
+
+    def box(self, x=None, y=None, margin=True):
+        # 对应前端 calculateTextBoundary，多行时按整块计算
+        x = self.style["x"] if x is None else x
+        y = self.style["y"] if y is None else y
+        height = self.line_height * len(self.lines)
+        align = self.style.get("textAlign", 'center')
+        if align == 'left':
+            left, right = x, x + self.width
+        elif align == 'right':
+            left, right = x - self.width, x
+        else:
+            left, right = x - self.width / 2, x + self.width / 2
+        top, bottom = y - height / 2, y + height / 2
+        if margin:
+            pad = self.style.get("strokeWidth", 0) + 3 + max(10, self.style["fontSize"] * 0.2)
+            left, top, right, bottom = left - pad, top - pad, right + pad, bottom + pad
+        return (left, top, right, bottom)
+
+    def to_dict(self):
+        return {
+            "lines": self.lines,
+            "x": round(self.style["x"], 1),
+            "y": round(self.style["y"], 1),
+            "fontSize": round(self.style["fontSize"], 1),
+            "color": self.style.get("color"),
+        }
+
+
+class TextPlacer:
+    """逐个放置文本元素，保证在图片内且互不重叠"""
+
+    STEP_SIZES = [20, 40, 60, 80, 100, 120, 150, 180, 210, 240, 270]
+    DIRECTIONS = [(0, -1), (0, 1), (-1, 0), (1, 0), (1, -1), (1, 1), (-1, 1), (-1, -1)]
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.placed = []
+
+    def within(self, box):
+        return box[0] >= 0 and box[1] >= 0 and box[2] <= self.width and box[3] <= self.height
+
+    def overlaps(self, box, tolerance=0):
+        for other in self.placed:
+            if not (box[2] - tolerance < other[0] + tolerance or box[0] + tolerance > other[2] - tolerance
+                    or box[3] - tolerance < other[1] + tolerance or box[1] + tolerance > other[3] - tolerance):
+                return True
+        return False
+
+    def fits(self, box, text_type):
+        return self.within(box) and not self.overlaps(box, 5 if text_type == 'dataText' else 0)
+
+    def find_position(self, item):
+        # 对应前端 findNonOverlappingPosition
+        left, top, right, bottom = item.box()
+        origin_x, origin_y = item.style["x"], item.style["y"]
+        text_width_px, text_height = right - left, bottom - top
+        if text_width_px > self.width * 0.8:
+            if item.key == 'dataText':
+                return self.width / 2, self.height - text_height / 2 - 15
+            return self.width / 2, origin_y
+
+        directions = list(self.DIRECTIONS)
+        if item.key == 'dataText':
+            directions.sort(key=lambda d: -abs(d[1]))
+        elif item.key in ('mainTitle', 'slogan'):
+            directions.sort(key=lambda d: abs(d[1]))
+
+        for step in self.STEP_SIZES:
+            for dx, dy in directions:
+                extra = dy * 30 if item.key == 'dataText' and dy else 0
+                x, y = origin_x + dx * step, origin_y + dy * step + extra
+                if self.fits(item.box(x, y), item.key):
+                    return x, y
+
+        if item.key == 'dataText':
+            # 底部居中、右下、左下
+            y = self.height - text_height / 2 - 15
+            for x in (self.width / 2, self.width - text_width_px / 2 - 15, text_width_px / 2 + 15):
+                if not self.overlaps(item.box(x, y), 10):
+                    return x, y
+        return None
+
+    def adjust(self, key, text, style):
+        # 对应前端 smartTextAdjustment
+        style = dict(style)
+        style["maxWidth"] = min(style.get("maxWidth") or self.width, self.width * 0.9)
+        if len(text) > 20:
+            style["fontSize"] = max(style["fontSize"] * min(1, 1.5 * (20 / len(text))), 12)
+        if key == 'dataText':
+            style["fontSize"] = min(style["fontSize"], 16 if len(text) <= 25 else 14)
+            if len(text) > 40:
+                style["maxWidth"] = min(style["maxWidth"], self.width * 0.75)
+            if style["y"] < self.height * 0.6:
+                style["y"] = self.height * 0.85
+        elif key == 'mainTitle':
+            style["fontSize"] = max(style["fontSize"], 24)
+            if len(text) > 10:
+                style["fontSize"] = max(style["fontSize"] * min(1, 1.2 * (10 / len(text))), 20)
+        elif key == 'slogan':
+            style["fontSize"] = max(style["fontSize"], 20)
+            if len(text) > 15:
+                style["fontSize"] = max(style["fontSize"] * min(1, 1.2 * (15 / len(text))), 18)
+        if style.get("textTransform") == 'uppercase':
+            text = text.upper()
+        elif style.get("textTransform") == 'lowercase':
+            text = text.lower()
+        return text, style
+
+    def layout(self, key, text, style):
+        font = load_font(style["fontSize"], style.get("fontWeight") == 'bold')
+        if key in ('mainTitle', 'slogan'):
+            # 标题和口号不换行，超宽时截断
+            lines = [truncate_text(text, style["maxWidth"], font)]
+        else:
+            lines = wrap_text(text, font, style["maxWidth"], key)
+        return PlacedText(key, lines, style, font)
+
+    def place(self, key, text, style):
+        text, style = self.adjust(key, text, style)
+        original = dict(style)
+        item = self.layout(key, text, style)
+        if not self.fits(item.box(), key):
+            position = self.find_position(item)
+            if position:
+                item.style["x"], item.style["y"] = position
+            else:
+                # 逐步缩小字体再找位置
+                for factor in (0.8, 0.7, 0.6, 0.5, 0.4):
+                    style = dict(original, fontSize=max(10, original["fontSize"] * factor))
+                    item = self.layout(key, text, style)
+                    if self.fits(item.box(), key):
+                        break
+                    position = self.find_position(item)
+                    if position:
+                        item.style["x"], item.style["y"] = position
+                        break
+                else:
+                    # 兜底：数据文本放到最底部，其他文本保持原位置并缩小
+                    style = dict(original, fontSize=max(10, original["fontSize"] * (0.3 if key == 'dataText' else 0.5)))
+                    if key == 'dataText':
+                        style.update(x=self.width / 2, textAlign='center', maxWidth=self.width * 0.9)
+                    item = self.layout(key, text, style)
+                    if key == 'dataText':
+                        item.style["y"] = self.height - item.line_height * len(item.lines) / 2 - 10
+        self.placed.append(item.box())
+        return item
+
+
+# ---------- 绘制 ----------
+def text_colors(brightness):
+    # 背景偏亮用深色文字，偏暗用白色文字（与前端 determineTextColor 的阈值一致）
+    if brightness > 0.6:
+        return (0, 0, 0), (255, 255, 255, 204), (255, 255, 255, 178)
+    return (255, 255, 255), (0, 0, 0, 204), (0, 0, 0, 178)
+
+
+def draw_text(image, item, stats):
+    fill, stroke, shadow = text_colors(stats.brightness(item.box(margin=False)))
+    item.style["color"] = '#%02x%02x%02x' % fill
+    alpha = int(255 * item.style.get("opacity", 1))
+    align = item.style.get("textAlign", 'center')
+    anchor = {'left': 'lm', 'right': 'rm'}.get(align, 'mm')
+    start_y = item.style["y"] - item.line_height * (len(item.lines) - 1) / 2
+
+    # 阴影单独一层模糊后再叠加
+    shadow_layer = Image.new('RGBA', image.size, (0, 0, 0, 0))
+    text_layer = Image.new('RGBA', image.size, (0, 0, 0, 0))
+    shadow_draw = ImageDraw.Draw(shadow_layer)
+    text_draw = ImageDraw.Draw(text_layer)
+    for i, line in enumerate(item.lines):
+        y = start_y + i * item.line_height
+        shadow_draw.text((item.style["x"] + 1, y + 1), line, font=item.font, anchor=anchor, fill=shadow)
+        text_draw.text(
+            (item.style["x"], y), line, font=item.font, anchor=anchor, fill=fill + (alpha,),
+            stroke_width=int(item.style.get("strokeWidth", 0)), stroke_fill=stroke
+        )
+    image.alpha_composite(shadow_layer.filter(ImageFilter.GaussianBlur(1.5)))
+    image.alpha_composite(text_layer)
+
+
+def fields_to_parts(fields):
+    # extract_info 的结果转换为前端使用的 textParts
+    parts = {}
+    for field, key in FIELD_KEYS:
+        value = (fields.get(field) or '').strip()
+        if value and value != "未找到":
+            parts[key] = value
+    return parts
+
+
+def render_poster(image, fields, template_id, stats, analysis):
+    # 返回 (PNG 字节, 每个文本元素的最终排版)
+    parts = fields_to_parts(fields)
+    width, height = image.size
+    if template_id == 'auto':
+        layout = auto_layout(analysis, parts)
+    else:
+        layout = template_layout(template_id, width, height)
+
+    canvas = image.convert('RGBA')
+    placer = TextPlacer(width, height)
+    placements = {}
+    for _, key in FIELD_KEYS:
+        if key in parts:
+            item = placer.place(key, parts[key], layout[key])
+            draw_text(canvas, item, stats)
+            placements[key] = item.to_dict()
+
+    buffer = io.BytesIO()
+    canvas.convert('RGB').save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue(), placements
+
+
+def available_templates():
+    templates = [
+        {"id": template_id, "name": template["name"], "description": template["description"]}
+        for template_id, template in LAYOUT_TEMPLATES.items()
+    ]
+    return templates + [{"id": "auto", "name": "自动布局", "description": "根据图片亮度分布自动安排文字位置"}]
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# 相似提示词索引：换个说法的提示词（语序不同、同义词、单复数）生成的背景图通常可以直接复用，不必再调用 SD
+# 提示词切成词集合（英文按词并做简单词形归一，中文取相邻两字），计算 MinHash 签名；
+# 签名分成若干段做 LSH，任一段完全相同的条目作为候选，再按签名估计的 Jaccard 相似度取最相近的一条
+# 条目保存在 sqlite 文件里，启动时载入内存；新条目增量写入，其他进程写入的条目查询时按间隔补读
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+
+from image_cache import normalize_prompt
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+# 置换参数固定，签名写入磁盘后在重启和多个进程之间保持一致
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+_BAND_MULT = _rng.integers(1, 1 << 63, ROWS, dtype=np.uint64) | np.uint64(1)
+
+# 几乎每条 SD 提示词都会带的质量词，不参与相似度计算
+STOPWORDS = {
+    'a', 'an', 'the', 'of', 'with', 'in', 'on', 'at', 'and', 'or', 'by', 'for', 'to', 'from',
+    'masterpiece', 'best', 'quality', 'high', 'highly', 'ultra', 'detailed', 'detail', 'hd', 'hdr',
+    '4k', '8k', 'uhd', 'realistic', 'photorealistic', 'resolution', 'sharp', 'focus',
+}
+# 常见的同义说法归到同一个词
+SYNONYMS = {
+    'dusk': 'sunset', 'sundown': 'sunset', 'twilight': 'sunset', 'evening': 'sunset',
+    'sunrise': 'dawn', 'daybreak': 'dawn', 'morning': 'dawn',
+    'sea': 'ocean', 'seaside': 'ocean', 'woods': 'forest', 'woodland': 'forest',
+    'metropolis': 'city', 'urban': 'city', 'cityscape': 'city',
+    'mountains': 'mountain', 'peak': 'mountain', 'iceberg': 'glacier', 'ice': 'glacier',
+    'earth': 'planet', 'globe': 'planet', 'trash': 'garbage', 'rubbish': 'garbage', 'waste': 'garbage',
+}
+_WORD = re.compile(r'[a-z0-9]+')
+_CJK = re.compile(r'[一-鿿]+')
+
+
+def _stem(word):
+    # 只处理常见词尾，melting/melted/melts 都归为 melt
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith('ss'):
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(prompt):
+    text = normalize_prompt(prompt)
+    tokens = set()
+    for word in _WORD.findall(text):
+        if word in STOPWORDS:
+            continue
+        word = SYNONYMS.get(word, word)
+        tokens.add(SYNONYMS.get(_stem(word), _stem(word)))
+    for run in _CJK.findall(text):
+        if len(run) == 1:
+            tokens.add(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def minhash(tokens):
+    # 返回 uint32 签名，没有可用的词时返回 None
+    if not tokens:
+        return None
+    x = np.array([int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=4).digest(), 'little')
+                  for t in tokens], dtype=np.uint64)
+    # (a * x + b) mod p，乘法按 uint64 溢出回绕（与 datasketch 的做法相同），各个置换之间才足够独立
+    values = (np.outer(x, _A) + _B) % np.uint64(_PRIME)
+    return (values.min(axis=0) & np.uint64(0xffffffff)).astype(np.uint32)
+
+
+def band_hashes(signatures):
+    # (n, NUM_PERM) -> (n, BANDS)，每段 ROWS 个值合成一个 uint64（溢出回绕即可）
+    rows = signatures.reshape(len(signatures), BANDS, ROWS).astype(np.uint64)
+    return (rows * _BAND_MULT).sum(axis=2, dtype=np.uint64)
+
+
+class PromptIndex:
+    def __init__(self, path, sync_interval=5.0):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.counters = {"lookups": 0, "matches": 0, "inserts": 0}
+        # 内存索引：签名矩阵按行追加（容量不够时翻倍），每段一个按哈希排序的数组，查询时二分
+        self.size = 0
+        self.signatures = np.zeros((1024, NUM_PERM), dtype=np.uint32)
+        self.alive = np.zeros(1024, dtype=bool)
+        self.scopes = np.zeros(1024, dtype=np.int32)
+        self.scope_ids = {}
+        self.entries = []
+        self.rows_by_hash = {}
+        self.band_keys = [np.zeros(0, dtype=np.uint64) for _ in range(BANDS)]
+        self.band_rows = [np.zeros(0, dtype=np.int32) for _ in range(BANDS)]
+        self.last_id = 0
+        self.synced_at = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prompts ("
+                "id INTEGER PRIMARY KEY, scope TEXT NOT NULL, prompt TEXT NOT NULL, blob_hash TEXT NOT NULL, "
+                "size INTEGER NOT NULL, signature BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+        self.sync(force=True)
+
+    def _connect(self):
+        # sqlite 连接不能跨线程使用，每个线程一个
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self.local.conn = conn
+        return conn
+
+    def __len__(self):
+        with self.lock:
+            return int(self.alive[:self.size].sum())
+
+    def sync(self, force=False):
+        # 读入 last_id 之后写入的条目（本进程或其他进程），距上次读取不到 sync_interval 时跳过
+        now = time.monotonic()
+        if not force and now - self.synced_at < self.sync_interval:
+            return
+        self.synced_at = now
+        rows = self._connect().execute(
+            "SELECT id, scope, prompt, blob_hash, size, signature FROM prompts WHERE id > ? ORDER BY id",
+            (self.last_id,)
+        ).fetchall()
+        rows = [row for row in rows if len(row[5]) == NUM_PERM * 4]
+        if rows:
+            self._index(rows)
+
+    def _index(self, rows):
+        signatures = np.frombuffer(b''.join(row[5] for row in rows), dtype=np.uint32).reshape(len(rows), NUM_PERM)
+        hashes = band_hashes(signatures)
+        with self.lock:
+            # 两个线程同时补读时只保留一份
+            rows_new = [i for i, row in enumerate(rows) if row[0] > self.last_id]
+            if not rows_new:
+                return
+            if len(rows_new) < len(rows):
+                rows = [rows[i] for i in rows_new]
+                signatures, hashes = signatures[rows_new], hashes[rows_new]
+            start, stop = self.size, self.size + len(rows)
+            if stop > len(self.signatures):
+                self._grow(stop)
+            self.signatures[start:stop] = signatures
+            self.alive[start:stop] = True
+            scopes = [self.scope_ids.setdefault(row[1], len(self.scope_ids)) for row in rows]
+            self.scopes[start:stop] = scopes
+            self.entries.extend((row[0], row[2], row[3], row[4]) for row in rows)
+            for row, (scope_id, entry) in enumerate(zip(scopes, rows), start):
+                self.rows_by_hash[(scope_id, entry[3])] = row
+            self.size = stop
+            new_rows = np.arange(start, stop, dtype=np.int32)
+            for band in range(BANDS):
+                keys, band_rows = self.band_keys[band], self.band_rows[band]
+                if len(rows) * 8 < len(keys):
+                    # 少量新条目：二分找到插入位置，只移动一次内存
+                    order = np.argsort(hashes[:, band], kind='stable')
+                    at = np.searchsorted(keys, hashes[order, band], 'right')
+                    self.band_keys[band] = np.insert(keys, at, hashes[order, band])
+                    self.band_rows[band] = np.insert(band_rows, at, new_rows[order])
+                else:
+                    keys = np.concatenate([keys, hashes[:, band]])
+                    order = np.argsort(keys, kind='stable')
+                    self.band_keys[band] = keys[order]
+                    self.band_rows[band] = np.concatenate([band_rows, new_rows])[order]
+            self.last_id = rows[-1][0]
+
+    def _grow(self, needed):
+        # 调用方持有锁
+        capacity = max(needed, len(self.signatures) * 2)
+        for name in ('signatures', 'alive', 'scopes'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, scope, prompt, blob_hash, size):
+        return self.add_many([(scope, prompt, blob_hash, size)])
+
+    def add_many(self, records):
+        # records 为 (scope, prompt, blob_hash, size)；scope 区分用户和生成参数，不同 scope 的图片互不复用
+        now = time.time()
+        rows = []
+        for scope, prompt, blob_hash, size in records:
+            signature = minhash(tokenize(prompt))
+            if signature is not None:
+                rows.append((scope, prompt, blob_hash, size, signature.tobytes(), now))
+        if not rows:
+            return 0
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO prompts (scope, prompt, blob_hash, size, signature, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        with self.lock:
+            self.counters["inserts"] += len(rows)
+        self.sync(force=True)
+        return len(rows)
+
+    def lookup(self, scope, prompt, threshold):
+        # 返回相似度不低于 threshold 的最相近条目 {"id", "prompt", "image_hash", "image_size", "similarity"}，没有时返回 None
+        signature = minhash(tokenize(prompt))
+        self.sync()
+        with self.lock:
+            self.counters["lookups"] += 1
+            scope_id = self.scope_ids.get(scope)
+            if signature is None or scope_id is None:
+                return None
+            query = band_hashes(signature[None, :])[0]
+            found = []
+            for band in range(BANDS):
+                keys = self.band_keys[band]
+                lo = np.searchsorted(keys, query[band], 'left')
+                hi = np.searchsorted(keys, query[band], 'right')
+                if hi > lo:
+                    found.append(self.band_rows[band][lo:hi])
+            if not found:
+                return None
+            candidates = np.unique(np.concatenate(found))
+            candidates = candidates[self.alive[candidates] & (self.scopes[candidates] == scope_id)]
+            if not len(candidates):
+                return None
+            similarity = (self.signatures[candidates] == signature).mean(axis=1)
+            best = int(np.argmax(similarity))
+            if similarity[best] < threshold:
+                return None
+            self.counters["matches"] += 1
+            entry_id, entry_prompt, blob_hash, size = self.entries[candidates[best]]
+        return {
+            "id": entry_id,
+            "prompt": entry_prompt,
+            "image_hash": blob_hash,
+            "image_size": size,
+            "similarity": round(float(similarity[best]), 4)
+        }
+
+    def get(self, scope, blob_hash):
+        # 按图片哈希取同一 scope 下的条目（similarity 为 None），没有时返回 None
+        self.sync()
+        with self.lock:
+            row = self.rows_by_hash.get((self.scope_ids.get(scope), blob_hash))
+            if row is None or not self.alive[row]:
+                return None
+            entry_id, entry_prompt, blob_hash, size = self.entries[row]
+        return {"id": entry_id, "prompt": entry_prompt, "image_hash": blob_hash, "image_size": size, "similarity": None}
+
+    def discard(self, entry_id):
+        # 图片已不存在的条目：从内存索引中标记删除并删除磁盘记录
+        with self.lock:
+            for row, entry in enumerate(self.entries):
+                if entry[0] == entry_id:
+                    self.alive[row] = False
+                    break
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM prompts WHERE id = ?", (entry_id,))
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                self.counters,
+                entries=int(self.alive[:self.size].sum()),
+                match_rate=round(self.counters["matches"] / self.counters["lookups"], 4) if self.counters["lookups"] else 0.0
+            )
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# 多个 SD 服务实例的注册表：定时请求 /hello 探活，记录每个实例正在处理的请求数，
+# 新请求发给进行中请求最少的健康实例；失败时换一个实例重试，移除实例时先停止分配、等进行中的请求结束
+import time
+import random
+import threading
+
+import requests
+
+from llm_client import UpstreamStats, NoWorkerAvailable
+
+
+class SDWorker:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.healthy = True
+        self.draining = False
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.last_probe_at = None
+        self.last_probe_ms = None
+        self.last_error = None
+        self.stats = UpstreamStats()
+        self.drained = threading.Event()
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "draining": self.draining,
+            "in_flight": self.in_flight,
+            "consecutive_failures": self.consecutive_failures,
+            "last_probe_at": self.last_probe_at,
+            "last_probe_ms": self.last_probe_ms,
+            "last_error": self.last_error,
+            "requests": self.stats.snapshot(),
+        }
+
+
+class SDWorkerPool:
+    def __init__(self, urls=(), probe_interval=10.0, probe_timeout=5.0, failure_threshold=2, headers=None):
+        # 连续失败 failure_threshold 次（请求或探活）后标记为不健康，探活成功后恢复
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.failure_threshold = failure_threshold
+        self.headers = headers or {}
+        self.lock = threading.Lock()
+        self.workers = {}
+        self.session = requests.Session()
+        self.stop_event = threading.Event()
+        self.thread = None
+        for url in urls:
+            self.add(url)
+
+    def add(self, url):
+        with self.lock:
+            worker = self.workers.get(url.rstrip('/'))
+            if worker is None or worker.draining:
+                # 正在移除的实例重新加入时作为新实例登记
+                worker = SDWorker(url)
+                self.workers[worker.url] = worker
+            return worker
+
+    def remove(self, url, timeout=None):
+        # 停止向该实例分配新请求，进行中的请求结束后从注册表删除；timeout 不为 None 时最多等待这么久，返回是否已删除
+        with self.lock:
+            worker = self.workers.get(url.rstrip('/'))
+            if worker is None:
+                raise KeyError(url)
+            worker.draining = True
+            if worker.in_flight == 0:
+                self._forget(worker)
+        if timeout is not None:
+            return worker.drained.wait(timeout)
+        return worker.drained.is_set()
+
+    def _forget(self, worker):
+        # 调用方持有锁
+        if self.workers.get(worker.url) is worker:
+            del self.workers[worker.url]
+        worker.drained.set()
+
+    def acquire(self, exclude=()):
+        # 选出进行中请求最少的健康实例，并发数相同时随机选，避免总是压在同一个实例上
+        with self.lock:
+            candidates = [w for w in self.workers.values() if not w.draining and w.url not in exclude]
+            healthy = [w for w in candidates if w.healthy]
+            # 全部不健康时仍然尝试，探活结果可能已经过时
+            pool = healthy or candidates
+            if not pool:
+                raise NoWorkerAvailable("没有可用的 SD 实例")
+            least = min(w.in_flight for w in pool)
+            worker = random.choice([w for w in pool if w.in_flight == least])
+            worker.in_flight += 1
+            return worker
+
+    def release(self, worker, seconds, error=False):
+        worker.stats.record(seconds, error)
+        with self.lock:
+            worker.in_flight -= 1
+            if error:
+                worker.consecutive_failures += 1
+                if worker.consecutive_failures >= self.failure_threshold:
+                    worker.healthy = False
+            else:
+                worker.consecutive_failures = 0
+                worker.healthy = True
+            if worker.draining and worker.in_flight == 0:
+                self._forget(worker)
+
+    def probe(self, worker):
+        start = time.perf_counter()
+        error = None
+        try:
+            response = self.session.get(worker.url + '/hello', headers=self.headers, timeout=self.probe_timeout)
+            if response.status_code != 200:
+                error = f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            error = type(e).__name__
+        with self.lock:
+            worker.last_probe_at = time.time()
+            worker.last_probe_ms = round((time.perf_counter() - start) * 1000, 2)
+            worker.last_error = error
+            if error is None:
+                worker.consecutive_failures = 0
+                worker.healthy = True
+            else:
+                worker.consecutive_failures += 1
+                if worker.consecutive_failures >= self.failure_threshold:
+                    worker.healthy = False
+        return error is None
+
+    def probe_all(self):
+        with self.lock:
+            workers = [w for w in self.workers.values() if not w.draining]
+        # 各实例并行探活，一个实例超时不拖慢其他实例
+        threads = [threading.Thread(target=self.probe, args=(w,), daemon=True) for w in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def start(self):
+        if self.probe_interval <= 0 or self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._run, name='sd-probe', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.probe_all()
+            self.stop_event.wait(self.probe_interval)
+
+    def close(self):
+        self.stop_event.set()
+        self.session.close()
+
+    def snapshot(self):
+        with self.lock:
+            return [worker.to_dict() for worker in self.workers.values()]
+
+    def __len__(self):
+        with self.lock:
+            return len(self.workers)
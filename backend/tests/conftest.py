@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# 后端模块按同级文件导入（与 python app.py 的运行方式一致），测试从 backend 目录导入
+import os
+import sys
+import socket
+import tempfile
+import importlib
+import subprocess
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def fake_sd():
+    # 启动本地假 SD 服务：fake_sd(delay) 返回 (url, 进程)，测试结束后全部结束
+    processes = []
+
+    def start(delay):
+        port = free_port()
+        process = start_fake('bench.fake_sd', port, '--delay', str(delay))
+        processes.append(process)
+        return f'http://127.0.0.1:{port}', process
+
+    yield start
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+def start_fake(module, port, *args):
+    from bench.suite import wait_for_port
+    process = subprocess.Popen([sys.executable, '-m', module, '--port', str(port), *args],
+                               cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return process
+
+
+@pytest.fixture(scope='session')
+def fake_llm_url():
+    # 整个测试会话共用一个假大模型服务
+    port = free_port()
+    process = start_fake('bench.fake_llm', port, '--tokens', '20', '--interval', '0.001')
+    yield f'http://127.0.0.1:{port}'
+    process.kill()
+    process.wait()
+
+
+@pytest.fixture(scope='session')
+def app_module(fake_llm_url):
+    # 整个后端应用：SQLite 文件库、临时图片目录，大模型指向假服务，SD 指向不存在的本地端口，不做 SD 探活
+    root = tempfile.mkdtemp(prefix='chat-tests-')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(root, 'app.db')}",
+        'BLOB_STORE_DIR': os.path.join(root, 'blobs'),
+        'BULK_DIR': os.path.join(root, 'bulk_runs'),
+        'DEEPSEEK_BASE_URL': fake_llm_url,
+        'DEEP_API_KEY': 'test',
+        'API_URL': 'http://127.0.0.1:1',
+        'SD_PROBE_INTERVAL': '0',
+    })
+    module = importlib.import_module('app')
+    with module.app.app_context():
+        module.db.create_all()
+    return module
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def make_user(app_module):
+    # 创建用户，返回 id
+    counter = iter(range(1, 1000000))
+
+    def create():
+        with app_module.app.app_context():
+            n = next(counter)
+            name = f'user{n}_{os.urandom(4).hex()}'
+            user = app_module.User(username=name, email=f'{name}@example.com', password_hash='x')
+            app_module.db.session.add(user)
+            app_module.db.session.commit()
+            return user.id
+    return create
+
+
+@pytest.fixture
+def sd_workers(app_module):
+    # 把应用的 SD 实例换成给定地址，测试结束后恢复
+    original = [w['url'] for w in app_module.sd_pool.snapshot()]
+
+    def replace(*urls):
+        for worker in app_module.sd_pool.snapshot():
+            app_module.sd_pool.remove(worker['url'])
+        for url in urls:
+            app_module.sd_pool.add(url)
+
+    yield replace
+    replace(*original)
+
+
+@pytest.fixture
+def fake_llm():
+    # 启动单独的假大模型服务：fake_llm('--interval', '0.05') 返回 (url, 进程)，测试结束后全部结束
+    processes = []
+
+    def start(*args):
+        port = free_port()
+        process = start_fake('bench.fake_llm', port, *args)
+        processes.append(process)
+        return f'http://127.0.0.1:{port}', process
+
+    yield start
+    for process in processes:
+        process.kill()
+        process.wait()
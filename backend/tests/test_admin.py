@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# 管理接口和指标接口：未配置令牌时一律拒绝（包括本机请求），配置后按 X-Admin-Token 或 Bearer 判断
+import pytest
+
+
+@pytest.fixture
+def admin_token(app_module):
+    original = app_module.app.config['ADMIN_TOKEN']
+    yield lambda token: app_module.app.config.__setitem__('ADMIN_TOKEN', token)
+    app_module.app.config['ADMIN_TOKEN'] = original
+
+
+def test_denied_without_token_even_from_loopback(client, admin_token):
+    admin_token(None)
+    for remote_addr in ('127.0.0.1', '::1'):
+        environ = {'REMOTE_ADDR': remote_addr}
+        assert client.get('/api/admin/sd-workers', environ_base=environ).status_code == 403
+        response = client.post('/api/admin/sd-workers', json={'url': 'http://169.254.169.254'},
+                               environ_base=environ)
+        assert response.status_code == 403
+        assert client.delete('/api/admin/sd-workers', json={'url': 'http://x'},
+                             environ_base=environ).status_code == 403
+
+
+def test_token_required_when_configured(client, admin_token):
+    admin_token('secret')
+    assert client.get('/api/admin/sd-workers').status_code == 403
+    assert client.get('/api/admin/sd-workers', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    response = client.get('/api/admin/sd-workers', headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'success'
+
+
+@pytest.mark.parametrize('path', ['/metrics', '/api/metrics/requests', '/api/metrics/upstreams'])
+def test_metrics_require_token(client, admin_token, path):
+    admin_token(None)
+    assert client.get(path, headers={'X-Admin-Token': ''}).status_code == 403
+    admin_token('secret')
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get(path, headers={'X-Admin-Token': 'secret'}).status_code == 200
+    # Prometheus 的抓取配置用 Authorization: Bearer
+    assert client.get(path, headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+
+def test_trace_finished_when_view_raises(app_module, client, admin_token, monkeypatch):
+    # 视图抛异常时 after_request 不执行，trace 由 teardown 结束并从采样器上摘下
+    from instrumentation import SamplingProfiler
+    hub = app_module.instrumentation_hub
+    monkeypatch.setattr(hub, 'profiler', SamplingProfiler(interval=0.001))
+    monkeypatch.setattr(hub, 'slow_seconds', 60.0)
+    monkeypatch.setitem(app_module.app.config, 'PROPAGATE_EXCEPTIONS', True)
+
+    def broken(limit, slowest):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(hub, 'recent_requests', broken)
+    admin_token('secret')
+    with pytest.raises(RuntimeError):
+        client.get('/api/metrics/requests', headers={'X-Admin-Token': 'secret'})
+    assert hub.profiler.active == {}
+    record = hub.recent[-1]
+    assert record['endpoint'] == 'request_metrics'
+    assert record['status'] == 500
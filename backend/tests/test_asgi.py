@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# ASGI /chat：与同步路径共用上游并发名额；客户端断开或上游中途出错时关闭上游流、归还名额，并保存已生成的部分回复
+import json
+import time
+import uuid
+import asyncio
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def asgi(app_module):
+    import asgi
+    return asgi
+
+
+@pytest.fixture
+def conversation(app_module, make_user):
+    user_id = make_user()
+    with app_module.app.app_context():
+        conversation = app_module.Conversation(user_id=user_id, title='test')
+        app_module.db.session.add(conversation)
+        app_module.db.session.commit()
+        return user_id, conversation.id
+
+
+@pytest.fixture
+def upstream(app_module, monkeypatch):
+    # 每个测试在自己的事件循环里新建异步客户端，可以指向单独的假大模型服务
+    clients = app_module.clients
+
+    def use(url=None):
+        if url:
+            monkeypatch.setattr(clients, 'base_url', url)
+        clients._async_client = None
+    use()
+    yield use
+    clients._async_client = None
+
+
+def in_flight(app_module):
+    return app_module.clients.stats['deepseek'].snapshot()['in_flight']
+
+
+def call(asgi, payload, on_send=None):
+    # 直接驱动 ASGI 应用；on_send(已发出的正文块数) 返回真时模拟客户端断开
+    sent = []
+
+    async def main():
+        gone = asyncio.Event()
+        requests = [{'type': 'http.request', 'body': json.dumps(payload).encode(), 'more_body': False}]
+
+        async def receive():
+            if requests:
+                return requests.pop(0)
+            await gone.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            bodies = [m for m in sent if m['type'] == 'http.response.body']
+            if on_send and on_send(len(bodies)):
+                gone.set()
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/chat',
+                 'headers': [(b'content-type', b'application/json')]}
+        try:
+            await asyncio.wait_for(asgi.application(scope, receive, send), 15)
+        finally:
+            if asgi.clients._async_client is not None:
+                await asgi.clients._async_client.close()
+                asgi.clients._async_client = None
+
+    asyncio.run(main())
+    status = next(m['status'] for m in sent if m['type'] == 'http.response.start')
+    body = b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body').decode('utf-8')
+    return status, body
+
+
+def replies(app_module, cid):
+    with app_module.app.app_context():
+        return [m.content for m in app_module.Message.query.filter_by(conversation_id=cid, role='assistant')]
+
+
+def payload(user_id, cid, **extra):
+    # 每次用不同的消息，避免命中生成缓存
+    return dict({'message': f'冰川 {uuid.uuid4().hex}', 'option': '文案', 'user_id': user_id,
+                 'conversation_id': cid}, **extra)
+
+
+def test_stream_completes_and_releases_slot(app_module, asgi, conversation, upstream):
+    user_id, cid = conversation
+    status, body = call(asgi, payload(user_id, cid))
+    assert status == 200
+    assert body.startswith('[主题凝练]')
+    assert replies(app_module, cid) == [body]
+    assert in_flight(app_module) == 0
+
+
+def test_client_disconnect_closes_upstream_and_saves_partial(app_module, asgi, conversation, upstream, fake_llm):
+    url, _ = fake_llm('--tokens', '200', '--interval', '0.05', '--latency', '0')
+    upstream(url)
+    user_id, cid = conversation
+    start = time.monotonic()
+    status, body = call(asgi, payload(user_id, cid), on_send=lambda bodies: bodies >= 3)
+    assert status == 200
+    # 200 个 token 需要 10 秒，断开后立即结束
+    assert time.monotonic() - start < 3
+    saved = replies(app_module, cid)
+    assert len(saved) == 1 and 0 < len(saved[0]) and saved[0].startswith(body)
+    assert in_flight(app_module) == 0
+
+
+def test_upstream_error_midstream_saves_partial_and_reports(app_module, asgi, conversation, upstream, fake_llm):
+    url, process = fake_llm('--tokens', '200', '--interval', '0.05', '--latency', '0')
+    upstream(url)
+    user_id, cid = conversation
+
+    def kill_upstream(bodies):
+        if bodies == 3:
+            process.kill()
+        return False
+
+    status, body = call(asgi, payload(user_id, cid, format='ndjson'), on_send=kill_upstream)
+    assert status == 200
+    events = [json.loads(line) for line in body.splitlines() if line]
+    assert events[-1]['event'] == 'error'
+    saved = replies(app_module, cid)
+    assert len(saved) == 1 and saved[0]
+    assert in_flight(app_module) == 0
+
+
+def test_asgi_shares_concurrency_limit_with_sync_path(app_module, asgi, conversation, upstream, monkeypatch):
+    clients = app_module.clients
+    monkeypatch.setitem(clients.semaphores, 'deepseek', threading.Semaphore(1))
+    monkeypatch.setattr(clients, 'acquire_timeout', 0.2)
+    user_id, cid = conversation
+    # 同步路径占着唯一的名额
+    with clients.slot('deepseek'):
+        status, body = call(asgi, payload(user_id, cid))
+    assert status == 503
+    assert json.loads(body)['status'] == 'error'
+    status, _ = call(asgi, payload(user_id, cid))
+    assert status == 200
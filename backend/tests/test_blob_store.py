@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# 图片存储接口：未实现全部方法的后端不能实例化
+import pytest
+
+from blob_store import BlobStore, LocalBlobStore, create_blob_store
+
+
+def test_backend_missing_methods_cannot_be_created():
+    class PartialStore(BlobStore):
+        def put(self, data):
+            return '', 0
+
+    with pytest.raises(TypeError, match='put_stream'):
+        PartialStore()
+    with pytest.raises(TypeError):
+        BlobStore()
+
+
+def test_local_store_implements_interface(tmp_path):
+    store = create_blob_store('local', root=str(tmp_path))
+    assert isinstance(store, LocalBlobStore)
+    blob_hash, size = store.put_stream([b'ab', b'cd'])
+    assert (blob_hash, size) == store.put(b'abcd')
+    assert store.exists(blob_hash) and store.size(blob_hash) == 4
+    store.delete(blob_hash)
+    store.delete(blob_hash)
+    assert not store.exists(blob_hash)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# 批量海报任务：用户ID校验，只有提交任务的用户能查看和恢复，结束的任务过期后从内存中清理
+import time
+
+import pytest
+
+
+@pytest.mark.parametrize('user_id', ['abc', '1.5', [1], 99999999])
+def test_submit_rejects_invalid_user_id(client, user_id):
+    response = client.post('/api/bulk-posters', json={'user_id': user_id, 'topics': ['冰川']})
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+
+def test_only_owner_can_view_and_resume(client, make_user):
+    owner, other = make_user(), make_user()
+    response = client.post('/api/bulk-posters', json={'user_id': str(owner), 'topics': ['冰川']})
+    assert response.status_code == 202
+    run_id = response.get_json()['run_id']
+    assert response.get_json()['status_url'].endswith(f'?user_id={owner}')
+
+    assert client.get(f'/api/bulk-posters/{run_id}').status_code == 404
+    assert client.get(f'/api/bulk-posters/{run_id}?user_id={other}').status_code == 404
+    progress = client.get(f'/api/bulk-posters/{run_id}?user_id={owner}')
+    assert progress.status_code == 200
+    assert progress.get_json()['progress']['total'] == 1
+
+    assert client.post(f'/api/bulk-posters/{run_id}/resume', json={'user_id': other}).status_code == 404
+    assert client.post(f'/api/bulk-posters/{run_id}/resume').status_code == 404
+    # 任务可能仍在运行（409）或已结束可以恢复（202）
+    assert client.post(f'/api/bulk-posters/{run_id}/resume', json={'user_id': owner}).status_code in (202, 409)
+
+
+def test_unknown_run_is_404(client, make_user):
+    user_id = make_user()
+    assert client.get(f'/api/bulk-posters/{"0" * 32}?user_id={user_id}').status_code == 404
+    assert client.post(f'/api/bulk-posters/{"0" * 32}/resume', json={'user_id': user_id}).status_code == 404
+
+
+def test_finished_runs_evicted_after_retention(app_module, client, make_user, monkeypatch):
+    user_id = make_user()
+    response = client.post('/api/bulk-posters', json={'user_id': user_id, 'topics': ['冰川']})
+    run_id = response.get_json()['run_id']
+    pipeline = app_module.bulk_runs[run_id]
+    # 等任务线程结束，之后再改 finished_at 不会被它覆盖
+    deadline = time.time() + 10
+    while pipeline.finished_at is None and time.time() < deadline:
+        time.sleep(0.02)
+    assert pipeline.finished_at is not None
+
+    # 运行中的任务不清理
+    monkeypatch.setitem(app_module.app.config, 'BULK_RETENTION', 0)
+    monkeypatch.setattr(pipeline, 'finished_at', None)
+    app_module.prune_bulk_runs()
+    assert run_id in app_module.bulk_runs
+    assert client.get(f'/api/bulk-posters/{run_id}?user_id={user_id}').status_code == 200
+
+    # 结束且超过保留时间后，查询进度时从内存中移除
+    monkeypatch.setattr(pipeline, 'finished_at', 1.0)
+    assert client.get(f'/api/bulk-posters/{run_id}?user_id={user_id}').status_code == 404
+    assert run_id not in app_module.bulk_runs
+    assert run_id not in app_module.bulk_owners
+
+    # 任务清单仍在磁盘上，可以恢复；查询不存在的任务不会往 bulk_owners 里加条目
+    assert app_module.user_owns_bulk_run(run_id, user_id)
+    assert run_id not in app_module.bulk_owners
+    monkeypatch.undo()
+    assert client.post(f'/api/bulk-posters/{run_id}/resume', json={'user_id': user_id}).status_code == 202
+    assert run_id in app_module.bulk_runs
+    assert app_module.bulk_owners[run_id] == user_id
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# 只读副本路由：两个 SQLite 文件分别充当主库和副本，两边写入不同的数据，看查询结果判断走了哪个库
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import select, update, text
+
+from db_pool import REPLICA_BIND, RoutingSession, engine_options, pool_metrics, read_only
+
+
+@pytest.fixture
+def env(tmp_path):
+    primary_url = f"sqlite:///{tmp_path / 'primary.db'}"
+    replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = primary_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(primary_url, 2, 2, 5, 3600, False)
+    app.config['SQLALCHEMY_BINDS'] = {
+        REPLICA_BIND: dict(engine_options(replica_url, 2, 2, 5, 3600, False), url=replica_url)
+    }
+    db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+
+    class Item(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(50), nullable=False)
+
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines[REPLICA_BIND])
+        with db.engines[None].begin() as conn:
+            conn.execute(Item.__table__.insert(), [{"id": 1, "name": "primary"}])
+        with db.engines[REPLICA_BIND].begin() as conn:
+            conn.execute(Item.__table__.insert(), [{"id": 1, "name": "replica"}])
+    yield app, db, Item
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def names(db, Item, bind_key=None):
+    with db.engines[bind_key].connect() as conn:
+        return sorted(conn.execute(select(Item.name)).scalars())
+
+
+def test_read_only_queries_hit_replica(env):
+    app, db, Item = env
+
+    @read_only(db)
+    def view():
+        return db.session.scalars(select(Item.name)).all(), db.session.get(Item, 1).name
+
+    with app.test_request_context():
+        assert view() == (["replica"], "replica")
+
+
+def test_queries_without_read_only_hit_primary(env):
+    app, db, Item = env
+    with app.test_request_context():
+        assert db.session.scalars(select(Item.name)).all() == ["primary"]
+
+
+def test_writes_inside_read_only_go_to_primary(env):
+    app, db, Item = env
+
+    @read_only(db)
+    def view():
+        db.session.add(Item(id=2, name="added"))
+        # 查询前的自动 flush 走主库，查询本身仍读副本
+        seen = db.session.scalars(select(Item.name).where(Item.id == 1)).all()
+        db.session.execute(update(Item).where(Item.id == 1).values(name="updated"))
+        db.session.commit()
+        return seen
+
+    with app.test_request_context():
+        assert view() == ["replica"]
+        assert names(db, Item) == ["added", "updated"]
+        assert names(db, Item, REPLICA_BIND) == ["replica"]
+
+
+def test_text_and_locking_selects_stay_on_primary(env):
+    app, db, Item = env
+
+    @read_only(db)
+    def view():
+        raw = db.session.execute(text("SELECT name FROM item")).scalars().all()
+        locked = db.session.scalars(select(Item.name).with_for_update()).all()
+        return raw, locked
+
+    with app.test_request_context():
+        assert view() == (["primary"], ["primary"])
+
+
+def test_pool_wait_metrics_recorded(env):
+    app, db, Item = env
+
+    @read_only(db)
+    def view():
+        return db.session.scalars(select(Item.name)).all()
+
+    with app.test_request_context():
+        view()
+    with app.test_request_context():
+        db.session.scalars(select(Item.name)).all()
+    with app.app_context():
+        metrics = pool_metrics(db.engines)
+    assert set(metrics) == {"primary", REPLICA_BIND}
+    for entry in metrics.values():
+        assert entry["pool"] == "TimedQueuePool"
+        assert entry["checkouts"] >= 1
+        assert entry["timeouts"] == 0
+        assert set(entry["wait_ms"]) == {"p50", "p99", "max"}
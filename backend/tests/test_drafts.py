@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# 草图只写入临时草图目录：不进消息图片存储和 SD 结果缓存，过期后删除
+import os
+import json
+import time
+
+from draft_store import DraftStore
+
+
+def age(store, blob_hash, seconds):
+    path = store.path(blob_hash)
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_draft_store_expires_and_prunes(tmp_path):
+    store = DraftStore(str(tmp_path), ttl=60)
+    old_hash, _ = store.put(b'old draft')
+    new_hash, _ = store.put(b'new draft')
+    age(store, old_hash, 120)
+
+    # 过期未清理的草图已不可读
+    assert not store.exists(old_hash)
+    assert store.exists(new_hash)
+    assert store.prune() == 1
+    assert not os.path.exists(store.path(old_hash))
+    with store.open(new_hash) as f:
+        assert f.read() == b'new draft'
+
+
+def test_rewriting_same_draft_restarts_ttl(tmp_path):
+    store = DraftStore(str(tmp_path), ttl=60)
+    blob_hash, _ = store.put_stream([b'same ', b'draft'])
+    age(store, blob_hash, 120)
+    store.put(b'same draft')
+    assert store.exists(blob_hash)
+
+
+def test_put_prunes_at_most_every_quarter_ttl(tmp_path):
+    store = DraftStore(str(tmp_path), ttl=60)
+    old_hash, _ = store.put(b'old draft')
+    age(store, old_hash, 120)
+    # 刚清理过，这次写入不再遍历目录
+    store.put(b'another draft')
+    assert os.path.exists(store.path(old_hash))
+    store.last_prune -= 60
+    store.put(b'third draft')
+    assert not os.path.exists(store.path(old_hash))
+
+
+def test_progressive_image_keeps_draft_out_of_blob_store(app_module, client, make_user, fake_sd, sd_workers):
+    url, _ = fake_sd(0.5)
+    sd_workers(url)
+    user_id = make_user()
+    response = client.post('/image', json={'message': 'draft tier test', 'user_id': user_id,
+                                           'progressive': True, 'format': 'ndjson'})
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+    draft = next(e for e in events if e['event'] == 'draft')
+    full = next(e for e in events if e['event'] == 'image')
+
+    assert draft['image_url'] == f"/api/images/drafts/{draft['image_hash']}"
+    assert not app_module.blob_store.exists(draft['image_hash'])
+    assert app_module.draft_store.exists(draft['image_hash'])
+    assert app_module.blob_store.exists(full['image_hash'])
+    draft_response = client.get(draft['image_url'])
+    assert draft_response.status_code == 200
+    assert draft_response.mimetype == 'image/png'
+    draft_response.close()
+
+    # SD 结果缓存里只有完整版
+    if app_module.image_cache is not None:
+        assert app_module.lookup_cached_image('draft tier test')[1] == (full['image_hash'], full['image_size'])
+
+
+def test_missing_draft_returns_404(client):
+    assert client.get('/api/images/drafts/' + '0' * 64).status_code == 404
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# SD 结果缓存只记录键到图片存储中哈希的对应，不另存图片
+import os
+
+from blob_store import LocalBlobStore
+from image_cache import ImageResultCache, image_cache_key
+
+
+def make_cache(tmp_path, max_entries=10):
+    store = LocalBlobStore(str(tmp_path / 'blobs'))
+    return store, ImageResultCache(str(tmp_path / 'cache.sqlite3'), store, max_entries)
+
+
+def files_under(path):
+    return sorted(name for _, _, names in os.walk(path) for name in names)
+
+
+def test_hit_returns_hash_in_blob_store_without_copy(tmp_path):
+    store, cache = make_cache(tmp_path)
+    blob_hash, size = store.put(b'png bytes')
+    key = image_cache_key('Glacier ,  sunset', {"steps": 20})
+    assert cache.get(key) is None
+    cache.put(key, blob_hash, size)
+    # 规范化后相同的提示词命中同一条目
+    assert cache.get(image_cache_key('glacier, sunset', {"steps": 20})) == (blob_hash, size)
+    # 磁盘上只有图片存储里的一份
+    assert files_under(tmp_path / 'blobs') == [blob_hash]
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_entry_dropped_when_blob_deleted(tmp_path):
+    store, cache = make_cache(tmp_path)
+    blob_hash, size = store.put(b'png bytes')
+    cache.put('k', blob_hash, size)
+    store.delete(blob_hash)
+    assert cache.get('k') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_eviction_removes_index_entries_not_blobs(tmp_path):
+    store, cache = make_cache(tmp_path, max_entries=2)
+    hashes = [store.put(f'image {i}'.encode())[0] for i in range(3)]
+    cache.put('a', hashes[0], 7)
+    cache.put('b', hashes[1], 7)
+    cache.get('a')
+    cache.put('c', hashes[2], 7)
+    # 最久未使用的 b 被淘汰，图片仍在图片存储中
+    assert cache.get('b') is None
+    assert cache.get('a') == (hashes[0], 7)
+    assert cache.get('c') == (hashes[2], 7)
+    assert all(store.exists(h) for h in hashes)
+    assert cache.stats()['evictions'] == 1
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# 图片任务队列：每个用户的任务数上限、排队和执行超时、结束任务的过期清理，以及 SSE 在任务结束时关闭
+import json
+import threading
+import time
+
+import pytest
+
+from image_jobs import ImageJobQueue, UserLimitError, SUCCEEDED, FAILED, TIMED_OUT, FINISHED
+
+
+class BlockingRunner:
+    """任务一直阻塞到 release()，用来让任务停在执行中"""
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def __call__(self, job):
+        self.event.wait(5)
+        return {"image_hash": "0" * 64, "image_size": 1}
+
+    def release(self):
+        self.event.set()
+
+
+@pytest.fixture
+def runner():
+    runner = BlockingRunner()
+    yield runner
+    runner.release()
+
+
+def wait_finished(job, timeout=5):
+    deadline = time.time() + timeout
+    while not job.finished and time.time() < deadline:
+        time.sleep(0.01)
+    assert job.finished
+
+
+def test_per_user_limit_counts_string_and_int_ids(runner):
+    jobs = ImageJobQueue(runner, workers=1, per_user_limit=2)
+    first = jobs.submit(7, prompt='a')
+    jobs.submit('7', prompt='b')
+    with pytest.raises(UserLimitError):
+        jobs.submit(7, prompt='c')
+    with pytest.raises(UserLimitError):
+        jobs.submit('7', prompt='c')
+    # 其他用户不受影响
+    jobs.submit(8, prompt='d')
+    assert jobs.stats()["rejected"] == 2
+
+    runner.release()
+    wait_finished(first)
+    jobs.submit('7', prompt='e')
+
+
+def test_invalid_user_id_rejected(runner):
+    jobs = ImageJobQueue(runner)
+    with pytest.raises(ValueError):
+        jobs.submit('abc', prompt='a')
+
+
+def test_queued_job_times_out(runner):
+    jobs = ImageJobQueue(runner, workers=1, per_user_limit=5, timeout=0.1)
+    running = jobs.submit(1, prompt='a')
+    queued = jobs.submit(1, prompt='b')
+    time.sleep(0.2)
+    runner.release()
+    wait_finished(queued)
+    assert running.status == SUCCEEDED
+    assert queued.status == TIMED_OUT
+    assert queued.error == "排队超时"
+
+
+def test_runner_timeout_marks_job_timed_out():
+    def runner(job):
+        raise TimeoutError()
+    jobs = ImageJobQueue(runner, workers=1)
+    job = jobs.submit(1, prompt='a')
+    wait_finished(job)
+    assert job.status == TIMED_OUT
+    assert jobs.stats()[TIMED_OUT] == 1
+
+
+def test_finished_jobs_expire_after_retention():
+    jobs = ImageJobQueue(lambda job: {"image_hash": "0" * 64, "image_size": 1}, workers=1, retention=0.05)
+    job = jobs.submit(1, prompt='a')
+    wait_finished(job)
+    assert jobs.get(job.id) is job
+    time.sleep(0.1)
+    # 清理在提交新任务时进行
+    jobs.submit(2, prompt='b')
+    assert jobs.get(job.id) is None
+
+
+def read_events(response):
+    events = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        if block.strip():
+            name, data = block.split('\n', 1)
+            assert name == 'event: status'
+            events.append(json.loads(data[len('data: '):]))
+    return events
+
+
+@pytest.mark.parametrize('fail', [False, True])
+def test_events_stream_ends_when_job_finishes(app_module, client, make_user, monkeypatch, fail):
+    release = threading.Event()
+
+    def runner(job):
+        release.wait(5)
+        if fail:
+            raise RuntimeError('SD 服务出错')
+        return {"image_hash": "0" * 64, "image_size": 1}
+
+    monkeypatch.setattr(app_module, 'image_jobs', ImageJobQueue(runner, workers=1))
+    user_id = make_user()
+    response = client.post('/api/image-jobs', json={'message': 'sunset', 'user_id': str(user_id)})
+    assert response.status_code == 202
+    events_url = response.get_json()['events_url']
+
+    threading.Timer(0.2, release.set).start()
+    response = client.get(events_url)
+    assert response.status_code == 200
+    events = read_events(response)
+    # 流在任务结束后关闭，最后一条是结束状态，之前都是未结束状态
+    assert events[-1]['status'] == (FAILED if fail else SUCCEEDED)
+    assert all(event['status'] not in FINISHED for event in events[:-1])
+    if fail:
+        assert events[-1]['error'] == 'SD 服务出错'
+    else:
+        assert events[-1]['result']['image_url']
+
+
+def test_submit_rejects_invalid_user_id(client):
+    response = client.post('/api/image-jobs', json={'message': 'sunset', 'user_id': 'abc'})
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
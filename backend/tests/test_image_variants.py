@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# 缩略图接口：转码超时返回 503 和 Retry-After，转码完成后可以正常取回
+import io
+import threading
+
+from PIL import Image
+
+
+def test_variant_timeout_returns_503(app_module, client, monkeypatch):
+    buffer = io.BytesIO()
+    Image.new('RGB', (300, 200), (200, 60, 30)).save(buffer, format='PNG')
+    image_hash, _ = app_module.blob_store.put(buffer.getvalue())
+
+    release = threading.Event()
+    render = app_module.image_variants._render
+
+    def slow_render(*args):
+        release.wait(5)
+        return render(*args)
+    monkeypatch.setattr(app_module.image_variants, '_render', slow_render)
+    monkeypatch.setitem(app_module.app.config, 'IMAGE_VARIANT_TIMEOUT', 0.05)
+
+    url = f'/api/images/{image_hash}?w=96&format=jpeg'
+    response = client.get(url)
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+    assert 'no-store' in response.headers['Cache-Control']
+
+    release.set()
+    monkeypatch.setitem(app_module.app.config, 'IMAGE_VARIANT_TIMEOUT', 5)
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    response.close()
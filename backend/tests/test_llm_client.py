@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+# 上游客户端：超时和连接池上限要真正传到 openai 使用的 HTTP 客户端上
+from llm_client import LLMClientManager
+
+
+def test_timeout_and_pool_limits_applied():
+    clients = LLMClientManager('key', 'http://127.0.0.1:1', max_connections=7, timeout=12.0, connect_timeout=3.0)
+    try:
+        timeout = clients.client.timeout
+        assert (timeout.connect, timeout.read) == (3.0, 12.0)
+        http_client = clients.client._client
+        assert (http_client.timeout.connect, http_client.timeout.read) == (3.0, 12.0)
+        assert http_client._transport._pool._max_connections == 7
+    finally:
+        clients.close()
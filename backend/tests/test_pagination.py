@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# 游标分页：游标自带 (排序值, id)，上一页最后一行被删除后仍能接着翻页，不漏也不重复
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def user_id(make_user):
+    return make_user()
+
+
+def add_conversations(app_module, user_id, count):
+    # 同一时刻创建，排序值相同，只靠 id 区分先后
+    with app_module.app.app_context():
+        conversations = [app_module.Conversation(user_id=user_id, title=f'c{i}') for i in range(count)]
+        app_module.db.session.add_all(conversations)
+        app_module.db.session.commit()
+        return [conversation.id for conversation in conversations]
+
+
+def add_messages(app_module, user_id, count):
+    with app_module.app.app_context():
+        conversation = app_module.Conversation(user_id=user_id, title='test')
+        app_module.db.session.add(conversation)
+        app_module.db.session.flush()
+        messages = []
+        for i in range(count):
+            message = app_module.Message(user_id=user_id, conversation_id=conversation.id, role='user', content=f'm{i}')
+            if i % 2:
+                # 一半用数据库默认时间，一半由应用写入带微秒的时间
+                message.created_at = datetime.now()
+            messages.append(message)
+            app_module.db.session.add(message)
+            app_module.db.session.flush()
+        app_module.db.session.commit()
+        return conversation.id, [message.id for message in messages]
+
+
+def delete(app_module, model, row_id):
+    with app_module.app.app_context():
+        app_module.db.session.delete(app_module.db.session.get(model, row_id))
+        app_module.db.session.commit()
+
+
+def test_conversations_continue_after_anchor_deleted(app_module, client, user_id):
+    ids = add_conversations(app_module, user_id, 5)
+    first = client.get('/api/conversations', query_string={'user_id': user_id, 'limit': 2}).get_json()
+    page = [c['id'] for c in first['conversations']]
+    assert page == sorted(ids, reverse=True)[:2]
+    assert first['has_more']
+
+    delete(app_module, app_module.Conversation, page[-1])
+    second = client.get('/api/conversations', query_string={
+        'user_id': user_id, 'limit': 10, 'cursor': first['next_cursor']}).get_json()
+    assert [c['id'] for c in second['conversations']] == sorted(ids, reverse=True)[2:]
+    assert not second['has_more']
+    assert second['next_cursor'] is None
+
+
+def test_messages_continue_after_anchor_deleted(app_module, client, user_id):
+    conversation_id, ids = add_messages(app_module, user_id, 6)
+    url = f'/api/conversations/{conversation_id}/messages'
+    body = client.get(url, query_string={'user_id': user_id, 'limit': 100}).get_json()
+    expected = [m['id'] for m in body['conversation']['messages']]
+    assert sorted(expected) == ids
+    seen = []
+    cursor = None
+    while True:
+        params = {'user_id': user_id, 'limit': 2}
+        if cursor:
+            params['cursor'] = cursor
+        body = client.get(url, query_string=params).get_json()
+        page = [m['id'] for m in body['conversation']['messages']]
+        seen += page
+        if not body['has_more']:
+            break
+        cursor = body['next_cursor']
+        # 翻页之间删掉游标所在的那一行
+        delete(app_module, app_module.Message, page[-1])
+    # 与一次取完的顺序一致，每条恰好出现一次
+    assert seen == expected
+
+
+def test_invalid_cursor_rejected(client, user_id):
+    # 只带 id 的旧格式游标同样按无效处理
+    for cursor in ('not-a-cursor', base64.urlsafe_b64encode(json.dumps({"id": 1}).encode()).decode()):
+        response = client.get('/api/conversations', query_string={'user_id': user_id, 'cursor': cursor})
+        assert response.status_code == 400
+        assert response.get_json()['status'] == 'error'
+
+
+def test_messages_newest_first(app_module, client, user_id):
+    conversation_id, ids = add_messages(app_module, user_id, 5)
+    url = f'/api/conversations/{conversation_id}/messages'
+    body = client.get(url, query_string={'user_id': user_id, 'limit': 100}).get_json()
+    oldest_first = [m['id'] for m in body['conversation']['messages']]
+    seen = []
+    cursor = None
+    while True:
+        params = {'user_id': user_id, 'limit': 2, 'order': 'desc'}
+        if cursor:
+            params['cursor'] = cursor
+        body = client.get(url, query_string=params).get_json()
+        seen += [m['id'] for m in body['conversation']['messages']]
+        if not body['has_more']:
+            break
+        cursor = body['next_cursor']
+    assert seen == oldest_first[::-1]
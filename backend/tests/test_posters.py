@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# 服务端海报合成的参数校验
+import io
+import base64
+
+import pytest
+from PIL import Image
+
+
+def png_base64():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (40, 90, 160)).save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+@pytest.mark.parametrize('fields', [['主题凝练'], 'not a dict', {'主题凝练': 123}, {'主题凝练': ['a']}])
+def test_compose_rejects_malformed_fields(client, make_user, fields):
+    response = client.post('/api/posters', json={'user_id': make_user(), 'fields': fields,
+                                                 'image_data': png_base64()})
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+
+def test_compose_rejects_non_string_text(client, make_user):
+    response = client.post('/api/posters', json={'user_id': make_user(), 'text': {'a': 1},
+                                                 'image_data': png_base64()})
+    assert response.status_code == 400
+
+
+def test_compose_accepts_fields_dict(client, make_user):
+    response = client.post('/api/posters', json={'user_id': make_user(), 'image_data': png_base64(),
+                                                 'fields': {'主题凝练': '守护冰川', '震撼标语': None}})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'success'
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# SD 多实例路由：在本地启动几个延迟不同的 fake_sd，检查最少进行中请求路由、实例被杀后的故障切换、摘除实例时的排空
+import time
+import threading
+from collections import Counter
+
+import pytest
+import requests
+
+from conftest import free_port
+from llm_client import LLMClientManager, NoWorkerAvailable
+from sd_pool import SDWorkerPool
+
+
+def make_clients(pool, concurrency=8):
+    return LLMClientManager(api_key='test', base_url='http://127.0.0.1:1', sd_pool=pool,
+                            sd_max_concurrency=concurrency, sd_max_retries=2)
+
+
+def post_image(clients, prompt='test'):
+    response = clients.sd_post('/image', json={'prompt': prompt}, headers={'Accept': 'image/png'})
+    response.close()
+    assert response.status_code == 200
+    return response.url.rsplit('/', 1)[0]
+
+
+def test_acquire_picks_least_outstanding_healthy_worker():
+    pool = SDWorkerPool(['http://a', 'http://b'], probe_interval=0, failure_threshold=2)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first.url, second.url} == {'http://a', 'http://b'}
+    pool.release(first, 0.01)
+    assert pool.acquire() is first
+
+    # 连续失败达到阈值后不再分配，即使它的进行中请求更少
+    pool.release(first, 0.01, error=True)
+    assert first.healthy
+    assert pool.acquire() is first
+    pool.release(first, 0.01, error=True)
+    assert not first.healthy
+    assert pool.acquire() is second
+
+
+def test_fast_worker_serves_more_requests(fake_sd):
+    fast, _ = fake_sd(0.05)
+    slow, _ = fake_sd(0.5)
+    pool = SDWorkerPool([fast, slow], probe_interval=0)
+    clients = make_clients(pool)
+    served = Counter()
+    lock = threading.Lock()
+
+    def worker(n):
+        for i in range(n):
+            url = post_image(clients, f'{threading.get_ident()}-{i}')
+            with lock:
+                served[url] += 1
+
+    threads = [threading.Thread(target=worker, args=(6,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    clients.close()
+    assert sum(served.values()) == 48
+    assert served[fast] > 2 * served[slow]
+    assert all(w['in_flight'] == 0 for w in pool.snapshot())
+
+
+def test_failover_after_worker_killed(fake_sd):
+    first, first_process = fake_sd(0.01)
+    second, _ = fake_sd(0.01)
+    pool = SDWorkerPool([first, second], probe_interval=0, probe_timeout=1, failure_threshold=2)
+    clients = make_clients(pool)
+    first_process.kill()
+    first_process.wait()
+
+    # 发给已停止实例的请求连接失败后换实例重试，调用方看不到错误
+    assert [post_image(clients, str(i)) for i in range(10)] == [second] * 10
+    pool.probe_all()
+    pool.probe_all()
+    health = {w['url']: w['healthy'] for w in pool.snapshot()}
+    assert health == {first: False, second: True}
+    clients.close()
+
+
+def test_remove_drains_in_flight_requests(fake_sd):
+    slow, _ = fake_sd(0.5)
+    fast, _ = fake_sd(0.01)
+    pool = SDWorkerPool([slow], probe_interval=0)
+    clients = make_clients(pool)
+    results = []
+    request = threading.Thread(target=lambda: results.append(post_image(clients, 'draining')))
+    request.start()
+    deadline = time.monotonic() + 5
+    while pool.snapshot()[0]['in_flight'] == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    pool.add(fast)
+    # 进行中的请求未结束：不会立即删除，也不再分配新请求
+    assert pool.remove(slow) is False
+    assert {w['url']: w['draining'] for w in pool.snapshot()} == {slow: True, fast: False}
+    assert post_image(clients, 'after remove') == fast
+
+    # 进行中的请求结束后才从注册表删除
+    request.join(5)
+    assert results == [slow]
+    assert [w['url'] for w in pool.snapshot()] == [fast]
+    clients.close()
+
+
+def test_no_worker_available_raises():
+    clients = make_clients(SDWorkerPool([], probe_interval=0))
+    with pytest.raises(NoWorkerAvailable):
+        clients.sd_post('/image', json={'prompt': 'x'})
+
+
+def test_image_returns_503_without_workers(app_module, client, make_user):
+    user_id = make_user()
+    urls = [w['url'] for w in app_module.sd_pool.snapshot()]
+    for url in urls:
+        app_module.sd_pool.remove(url)
+    try:
+        response = client.post('/image', json={'message': 'no workers here', 'user_id': user_id})
+        assert response.status_code == 503
+        assert response.get_json()['status'] == 'error'
+    finally:
+        for url in urls:
+            app_module.sd_pool.add(url)
+
+
+def test_read_timeout_is_not_retried(fake_sd):
+    first, _ = fake_sd(1.0)
+    second, _ = fake_sd(1.0)
+    pool = SDWorkerPool([first, second], probe_interval=0)
+    clients = make_clients(pool)
+    start = time.monotonic()
+    with pytest.raises(requests.ReadTimeout):
+        clients.sd_post('/image', json={'prompt': 'slow'}, timeout=(1, 0.2))
+    # 只发出一次请求，不换实例重试
+    assert time.monotonic() - start < 0.9
+    assert sum(w['requests']['count'] for w in pool.snapshot()) == 1
+    clients.close()
+
+
+def test_connect_failure_is_retried_on_another_worker(fake_sd):
+    live, _ = fake_sd(0.01)
+    pool = SDWorkerPool([f'http://127.0.0.1:{free_port()}', live], probe_interval=0)
+    clients = make_clients(pool)
+    assert [post_image(clients, str(i)) for i in range(4)] == [live] * 4
+    clients.close()
+
+
+def test_deadline_caps_attempt_timeout(fake_sd):
+    slow, _ = fake_sd(2.0)
+    clients = make_clients(SDWorkerPool([slow], probe_interval=0))
+    start = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        clients.sd_post('/image', json={'prompt': 'slow'}, deadline=time.time() + 0.3)
+    assert time.monotonic() - start < 1.0
+    clients.close()
+
+
+def test_deadline_stops_retries_and_backoff():
+    # 唯一的实例连不上：没有截止时间时会按退避一直重试到次数用完
+    pool = SDWorkerPool([f'http://127.0.0.1:{free_port()}'], probe_interval=0, failure_threshold=100)
+    clients = LLMClientManager(api_key='test', base_url='http://127.0.0.1:1', sd_pool=pool, sd_max_retries=6)
+    start = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        clients.sd_post('/image', json={'prompt': 'x'}, deadline=time.time() + 0.4)
+    assert time.monotonic() - start < 1.0
+    with pytest.raises(requests.Timeout):
+        clients.sd_post('/image', json={'prompt': 'x'}, deadline=time.time() - 1)
+    clients.close()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# 历史搜索：标题匹配在前、内容匹配在后，offset 和 limit 作用在拼接后的结果上，逐页翻完不漏不重
+import pytest
+
+
+@pytest.fixture
+def history(app_module, make_user):
+    # 3 个标题匹配的会话，另有 3 个会话只有消息内容匹配
+    user_id = make_user()
+    with app_module.app.app_context():
+        session = app_module.db.session
+        titles = []
+        for i in range(3):
+            conversation = app_module.Conversation(user_id=user_id, title=f'海报文案 {i}')
+            session.add(conversation)
+            session.flush()
+            titles.append(conversation.id)
+        contents = []
+        for i in range(3):
+            conversation = app_module.Conversation(user_id=user_id, title=f'会话 {i}')
+            session.add(conversation)
+            session.flush()
+            session.add(app_module.Message(user_id=user_id, conversation_id=conversation.id, role='user',
+                                           content=f'帮我写一段海报文案 {i}'))
+            contents.append(conversation.id)
+        session.commit()
+    return user_id, titles, contents
+
+
+def search(client, user_id, offset):
+    response = client.get('/api/search', query_string={'user_id': user_id, 'q': '海报文案', 'limit': 2,
+                                                       'offset': offset})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_offset_applies_to_combined_results(client, history):
+    user_id, titles, contents = history
+    pages = []
+    offset = 0
+    while offset is not None:
+        body = search(client, user_id, offset)
+        pages.append(([c['id'] for c in body['results']['conversations']],
+                      [m['conversation_id'] for m in body['results']['messages']]))
+        assert body['has_more'] == (body['next_offset'] is not None)
+        offset = body['next_offset']
+
+    assert [len(t) + len(m) for t, m in pages] == [2, 2, 2]
+    # 第一页全是标题匹配，第二页标题与内容各一条，第三页是剩下的内容匹配
+    assert [len(t) for t, _ in pages] == [2, 1, 0]
+    assert sorted(sum((t for t, _ in pages), [])) == titles
+    assert sorted(sum((m for _, m in pages), [])) == contents
+
+
+def test_offset_past_title_matches(client, history):
+    user_id, _, contents = history
+    body = search(client, user_id, 4)
+    assert body['results']['conversations'] == []
+    assert len(body['results']['messages']) == 2
+    assert body['next_offset'] is None
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# ThinkFilter 按任意位置切块输入的结果必须与整段文本一次处理相同
+import re
+import json
+import itertools
+
+import pytest
+
+from think_filter import ThinkFilter, strip_think, CLOSE_TAG
+from chat_stream import PlainOutput, StructuredOutput
+
+SAMPLES = [
+    "<think>\n先分析主题\n</think>\n\nglacier melting, sunset, watercolor",
+    "before<think>hidden</think>after",
+    "<think>a</think> one <think>b\n</think>\ttwo",
+    "a < b and <thin is not a tag",
+    "stray </think> outside a block",
+    "prompt ends with half a tag <thi",
+    "kept <think>never closed",
+    "<think></think>",
+    "<<think>x</think>>",
+    "",
+]
+
+
+def reference(text):
+    # 整段文本的期望结果：去掉完整的思考块及其后的空白，未闭合的思考块丢弃到结尾
+    text = re.sub(r'<think>.*?</think>[ \t\r\n]*', '', text, flags=re.DOTALL)
+    return re.sub(r'<think>.*\Z', '', text, flags=re.DOTALL)
+
+
+def splits(text):
+    # 不切、所有两段切法、所有三段切法、逐字符
+    yield [text]
+    for i in range(len(text) + 1):
+        yield [text[:i], text[i:]]
+    for i, j in itertools.combinations(range(len(text) + 1), 2):
+        yield [text[:i], text[i:j], text[j:]]
+    yield list(text)
+
+
+def run_filter(chunks):
+    think_filter = ThinkFilter()
+    output = []
+    for chunk in chunks:
+        output.append(think_filter.feed(chunk))
+        # 留到下一块的只有可能是半个标签的尾巴
+        assert len(think_filter.pending) < len(CLOSE_TAG)
+    return ''.join(output), think_filter.flush()
+
+
+@pytest.mark.parametrize('text', SAMPLES)
+def test_strip_think_matches_reference(text):
+    assert strip_think(text) == reference(text)
+
+
+@pytest.mark.parametrize('text', SAMPLES)
+def test_every_split_gives_same_output_and_trailer(text):
+    expected = reference(text)
+    for chunks in splits(text):
+        body, trailer = run_filter(chunks)
+        assert body + trailer == expected, chunks
+        # 结束时补出的只有留着的半个开始标签
+        assert expected.endswith(trailer), chunks
+        assert len(trailer) < len(CLOSE_TAG), chunks
+
+
+@pytest.mark.parametrize('text', SAMPLES)
+def test_plain_output_every_split(text):
+    expected = reference(text)
+    for chunks in splits(text):
+        output = PlainOutput(strip_think=True)
+        streamed = ''.join(output.feed(chunk) for chunk in chunks) + output.finish()
+        assert streamed == expected, chunks
+
+
+def parse_ndjson(stream):
+    return [json.loads(line) for line in stream.splitlines() if line]
+
+
+@pytest.mark.parametrize('text', SAMPLES)
+def test_structured_output_done_event_every_split(text):
+    # 去除思考后的完整提示词在 done 事件中，delta 拼起来也与之相同
+    expected = reference(text)
+    for chunks in splits(text):
+        output = StructuredOutput('ndjson', strip_think=True)
+        stream = ''.join(output.feed(chunk) for chunk in chunks) + output.finish()
+        events = parse_ndjson(stream)
+        assert events[-1]["event"] == 'done'
+        assert events[-1]["prompt"] == expected, chunks
+        assert ''.join(e["text"] for e in events if e["event"] == 'delta') == expected, chunks
+
+
+def test_structured_output_keeps_raw_deltas_without_strip():
+    text = "<think>\nx\n</think>\n\nprompt"
+    output = StructuredOutput('ndjson')
+    events = parse_ndjson(''.join(output.feed(c) for c in text) + output.finish())
+    assert ''.join(e["text"] for e in events if e["event"] == 'delta') == text
+    assert events[-1]["prompt"] == "prompt"
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# 消息组提交：已有会话的用户消息写入失败时请求必须失败；写入前请求会话里不能有未提交的修改
+import time
+
+import pytest
+
+
+@pytest.fixture
+def conversation_id(app_module, make_user):
+    user_id = make_user()
+    with app_module.app.app_context():
+        conversation = app_module.Conversation(user_id=user_id, title='test')
+        app_module.db.session.add(conversation)
+        app_module.db.session.commit()
+        return user_id, conversation.id
+
+
+def messages(app_module, cid):
+    with app_module.app.app_context():
+        return [(m.role, m.content) for m in
+                app_module.Message.query.filter_by(conversation_id=cid).order_by(app_module.Message.id)]
+
+
+def test_start_chat_returns_commit_future(app_module, conversation_id):
+    user_id, cid = conversation_id
+    with app_module.app.test_request_context():
+        returned_id, error, saved = app_module.start_chat(user_id, cid, 'hello')
+        assert (returned_id, error) == (cid, None)
+        assert app_module.user_message_saved(saved)
+    assert messages(app_module, cid) == [('user', 'hello')]
+
+
+def test_chat_saves_question_and_reply(app_module, client, conversation_id):
+    user_id, cid = conversation_id
+    response = client.post('/chat', json={'message': 'hello', 'option': '文案', 'user_id': user_id,
+                                          'conversation_id': cid})
+    assert response.status_code == 200
+    response.get_data()
+    assert [role for role, _ in messages(app_module, cid)] == ['user', 'assistant']
+
+
+@pytest.mark.parametrize('path', ['/chat', '/background-poster'])
+def test_failed_user_message_write_fails_request(app_module, client, conversation_id, monkeypatch, path):
+    user_id, cid = conversation_id
+
+    def fail(records):
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(app_module.message_writer, 'flusher', fail)
+    response = client.post(path, json={'message': 'lost', 'option': '文案', 'user_id': user_id,
+                                       'conversation_id': cid})
+    assert response.status_code == 500
+    assert response.get_json()['status'] == 'error'
+    # 提问没保存时也不保存回复
+    monkeypatch.undo()
+    time.sleep(0.05)
+    assert messages(app_module, cid) == []
+
+
+def test_write_refuses_uncommitted_changes(app_module, make_user):
+    user_id = make_user()
+    with app_module.app.test_request_context():
+        app_module.db.session.add(app_module.Conversation(user_id=user_id, title='pending'))
+        with pytest.raises(RuntimeError):
+            app_module.write_message(app_module.message_record(user_id, None, 'user', 'x'))
+        app_module.db.session.rollback()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# 流式去除 <think>…</think>：逐块输入，标签可以被切在任意两个分块之间
+# 每块只与上一块留下的不足一个标签长度的尾巴拼接后查找一次，总耗时与输入长度成正比
+OPEN_TAG = '<think>'
+CLOSE_TAG = '</think>'
+
+
+def partial_tag_length(text, start, tag):
+    # text[start:] 的末尾与 tag 开头重合的最大长度（不含完整的 tag）
+    for length in range(min(len(tag) - 1, len(text) - start), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class ThinkFilter:
+    def __init__(self):
+        self.inside = False
+        # 刚结束思考块时跳过紧跟的空行
+        self.skip_space = False
+        self.pending = ''
+
+    def feed(self, chunk):
+        text = self.pending + chunk
+        self.pending = ''
+        output = []
+        pos = 0
+        while pos < len(text):
+            if self.skip_space:
+                while pos < len(text) and text[pos] in ' \t\r\n':
+                    pos += 1
+                if pos == len(text):
+                    break
+                self.skip_space = False
+
+            tag = CLOSE_TAG if self.inside else OPEN_TAG
+            index = text.find(tag, pos)
+            if index == -1:
+                # 末尾可能是半个标签，留到下一块再判断
+                keep = partial_tag_length(text, pos, tag)
+                if not self.inside:
+                    output.append(text[pos:len(text) - keep])
+                self.pending = text[len(text) - keep:]
+                break
+
+            if not self.inside:
+                output.append(text[pos:index])
+            pos = index + len(tag)
+            self.inside = not self.inside
+            self.skip_space = not self.inside
+        return ''.join(output)
+
+    def flush(self):
+        # 流结束：未闭合的思考块整体丢弃，留着的半个开始标签原样输出
+        rest = '' if self.inside else self.pending
+        self.pending = ''
+        return rest
+
+
+def strip_think(text):
+    think_filter = ThinkFilter()
+    return think_filter.feed(text) + think_filter.flush()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# 会话标题的后台生成队列：流式回复结束后只需投递会话ID，不再阻塞请求线程
+# 同一会话在队列中只保留一个任务，工作线程批量取出处理，失败按带抖动的退避重试
+import time
+import queue
+import random
+import threading
+
+
+class TitleQueue:
+    def __init__(self, handler, on_failure=None, workers=2, batch_size=8, batch_wait=0.05, max_retries=3, retry_delay=1.0):
+        # handler(conversation_ids) 处理一批会话，返回处理失败、需要重试的会话ID列表
+        # on_failure(conversation_id) 在重试次数用完后调用
+        self.handler = handler
+        self.on_failure = on_failure
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.attempts = {}
+        self.threads = []
+        self.counters = {"submitted": 0, "deduplicated": 0, "completed": 0, "retried": 0, "failed": 0, "batches": 0}
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'title-worker-{i}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, conversation_id):
+        # 已在排队或重试中的会话直接忽略
+        self.start()
+        with self.lock:
+            if conversation_id in self.pending:
+                self.counters["deduplicated"] += 1
+                return False
+            self.pending.add(conversation_id)
+            self.attempts[conversation_id] = 0
+            self.counters["submitted"] += 1
+        self.queue.put(conversation_id)
+        return True
+
+    def is_pending(self, conversation_id):
+        with self.lock:
+            return conversation_id in self.pending
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                failed = set(self.handler(batch) or [])
+            except Exception as e:
+                print(f"生成标题批次失败：{str(e)}")
+                failed = set(batch)
+
+            with self.lock:
+                self.counters["batches"] += 1
+            for conversation_id in batch:
+                if conversation_id in failed:
+                    self._retry(conversation_id)
+                else:
+                    self._finish(conversation_id, "completed")
+
+    def _retry(self, conversation_id):
+        with self.lock:
+            attempt = self.attempts.get(conversation_id, 0) + 1
+            self.attempts[conversation_id] = attempt
+        if attempt > self.max_retries:
+            if self.on_failure:
+                try:
+                    self.on_failure(conversation_id)
+                except Exception as e:
+                    print(f"处理标题生成失败时出错：{str(e)}")
+            self._finish(conversation_id, "failed")
+            return
+        with self.lock:
+            self.counters["retried"] += 1
+        delay = random.uniform(0, self.retry_delay * (2 ** (attempt - 1)))
+        timer = threading.Timer(delay, self.queue.put, [conversation_id])
+        timer.daemon = True
+        timer.start()
+
+    def _finish(self, conversation_id, outcome):
+        with self.lock:
+            self.pending.discard(conversation_id)
+            self.attempts.pop(conversation_id, None)
+            self.counters[outcome] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, pending=len(self.pending), queued=self.queue.qsize())
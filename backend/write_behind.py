@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# 消息写入的组提交队列：各请求把要写入的消息投递进来，后台线程把同一时间窗内的写入合并成一个事务
+# 每次写入返回 Future，提交成功后才完成，需要持久化保证的调用方等待它即可；等待时间不超过 max_delay 加一次提交的耗时
+# 整批失败时逐条重试，一条坏数据（如会话已被删除）不会连累同批的其他写入
+# submit_many 投递的一组记录始终在同一个事务中写入，重试时也不会拆开
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+BATCH_BUCKETS = (1, 4, 16, 64, 256)
+
+
+class WriteBehindQueue:
+    def __init__(self, flusher, max_batch=200, max_delay=0.01, enabled=True, window=1000):
+        # flusher(records) 在一个事务中写入一批记录，出错时抛出异常
+        self.flusher = flusher
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.enabled = enabled
+
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+        self.counters = {"submitted": 0, "written": 0, "failed": 0, "batches": 0, "retried_batches": 0}
+        self.batch_sizes = {bucket: 0 for bucket in BATCH_BUCKETS}
+        self.batch_sizes["more"] = 0
+        self.flush_seconds = deque(maxlen=window)
+        self.wait_seconds = deque(maxlen=window)
+
+    def submit(self, record):
+        return self._submit(record)
+
+    def submit_many(self, records):
+        return self._submit(list(records))
+
+    def _submit(self, record):
+        future = Future()
+        item = (record, future, time.perf_counter())
+        with self.lock:
+            self.counters["submitted"] += 1
+            direct = not self.enabled or self.closed
+            if not direct:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                    self.thread.start()
+                # 在锁内入队，保证不会排在 close 的结束标记之后
+                self.queue.put(item)
+        if direct:
+            # 关闭组提交时直接在调用线程里单独提交
+            self._flush([item])
+        return future
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        if batch[0] is None:
+            return batch
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # 时间窗结束后仍把已经排队的写入一并带上
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is None:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            if batch:
+                self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch):
+        start = time.perf_counter()
+        try:
+            records = []
+            for record, _, _ in batch:
+                if isinstance(record, list):
+                    records.extend(record)
+                else:
+                    records.append(record)
+            self.flusher(records)
+        except Exception as e:
+            if len(batch) == 1:
+                self._complete(batch, start, e)
+                return
+            print(f"批量写入失败，逐条重试：{str(e)}")
+            with self.lock:
+                self.counters["retried_batches"] += 1
+            for item in batch:
+                self._flush([item])
+            return
+        self._complete(batch, start, None)
+
+    def _complete(self, batch, start, error):
+        end = time.perf_counter()
+        with self.lock:
+            self.counters["batches"] += 1
+            self.counters["failed" if error else "written"] += len(batch)
+            bucket = next((b for b in BATCH_BUCKETS if len(batch) <= b), "more")
+            self.batch_sizes[bucket] += 1
+            self.flush_seconds.append(end - start)
+            self.wait_seconds.extend(end - queued_at for _, _, queued_at in batch)
+        for _, future, _ in batch:
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(True)
+
+    def close(self, timeout=5.0):
+        # 进程退出前写完已排队的记录，之后的写入直接同步提交
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            thread = self.thread
+        if thread:
+            self.queue.put(None)
+            thread.join(timeout)
+
+    def stats(self):
+        with self.lock:
+            flush = sorted(self.flush_seconds)
+            wait = sorted(self.wait_seconds)
+            batches = self.counters["batches"]
+            return dict(
+                self.counters,
+                enabled=self.enabled,
+                queued=self.queue.qsize(),
+                avg_batch_size=round((self.counters["written"] + self.counters["failed"]) / batches, 2) if batches else 0.0,
+                batch_sizes={f"<={b}" if b != "more" else f">{BATCH_BUCKETS[-1]}": n for b, n in self.batch_sizes.items()},
+                flush_ms={"p50": percentile_ms(flush, 50), "p99": percentile_ms(flush, 99)},
+                durable_wait_ms={"p50": percentile_ms(wait, 50), "p99": percentile_ms(wait, 99)},
+            )
+
+
+def percentile_ms(ordered, p):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return round(ordered[index] * 1000, 2)
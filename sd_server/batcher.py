@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# 微批调度：在很短的窗口内收集并发请求，参数兼容的请求合并成一次批量推理
+# 完全相同的 (prompt, negative_prompt, seed, steps, guidance_scale, 尺寸) 只生成一次，所有请求方共享结果
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class GenerationRequest:
+    def __init__(self, prompt, negative_prompt, seed, steps, guidance_scale, width=None, height=None):
+        self.prompt = prompt
+        self.negative_prompt = negative_prompt
+        self.seed = seed
+        self.steps = steps
+        self.guidance_scale = guidance_scale
+        # None 表示模型原生分辨率
+        self.width = width
+        self.height = height
+        self.future = Future()
+        self.waiters = 1
+
+    @property
+    def key(self):
+        return (self.prompt, self.negative_prompt, self.seed, self.steps, self.guidance_scale, self.width, self.height)
+
+    @property
+    def batch_key(self):
+        # 同一次 pipeline 调用只能使用相同的步数、引导系数和尺寸
+        return (self.steps, self.guidance_scale, self.width, self.height)
+
+
+class MicroBatcher:
+    def __init__(self, render, max_batch_size=4, max_wait=0.05):
+        # render(requests) 对一批请求执行推理，按顺序返回每个请求的结果
+        self.render = render
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.pending = OrderedDict()
+        self.running = {}
+        self.thread = None
+        self.counters = {"requests": 0, "coalesced": 0, "generated": 0, "batches": 0, "errors": 0}
+        self.batch_sizes = {}
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='sd-batcher', daemon=True)
+                self.thread.start()
+
+    def submit(self, prompt, negative_prompt=None, seed=42, steps=20, guidance_scale=7.0, width=None, height=None):
+        # 返回 Future，结果为 render 对该请求的输出
+        self.start()
+        request = GenerationRequest(prompt, negative_prompt, seed, steps, guidance_scale, width, height)
+        with self.lock:
+            self.counters["requests"] += 1
+            existing = self.pending.get(request.key) or self.running.get(request.key)
+            if existing is not None:
+                existing.waiters += 1
+                self.counters["coalesced"] += 1
+                return existing.future
+            self.pending[request.key] = request
+            self.not_empty.notify()
+        return request.future
+
+    def _next_batch(self):
+        with self.lock:
+            while not self.pending:
+                self.not_empty.wait()
+            first = next(iter(self.pending.values()))
+
+        # 第一个请求到达后再等一小段时间，让并发请求凑成一批
+        deadline = time.monotonic() + self.max_wait
+        with self.lock:
+            while True:
+                compatible = [r for r in self.pending.values() if r.batch_key == first.batch_key]
+                remaining = deadline - time.monotonic()
+                if len(compatible) >= self.max_batch_size or remaining <= 0:
+                    break
+                self.not_empty.wait(remaining)
+            batch = compatible[:self.max_batch_size]
+            for request in batch:
+                del self.pending[request.key]
+                self.running[request.key] = request
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self.render(batch)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"render 返回 {len(results)} 个结果，期望 {len(batch)} 个")
+            except Exception as e:
+                with self.lock:
+                    self.counters["errors"] += 1
+                    for request in batch:
+                        del self.running[request.key]
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            with self.lock:
+                self.counters["batches"] += 1
+                self.counters["generated"] += len(batch)
+                self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+                for request in batch:
+                    del self.running[request.key]
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                self.counters,
+                pending=len(self.pending),
+                running=len(self.running),
+                batch_sizes={str(size): count for size, count in sorted(self.batch_sizes.items())}
+            )
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# 推理部分：加载 diffusers 管线、批量生成并编码为 PNG，以及不需要 GPU 的假管线
+import io
+import time
+import hashlib
+
+from PIL import Image
+
+MODEL_ID = "stabilityai/stable-diffusion-2-1"
+NEGATIVE_PROMPT = "模糊、低质量"
+OUTPUT_SIZE = (400, 400)
+
+# 生成档位：draft 步数少，几秒内先给出构图供排版；full 为原来的 20 步
+# 两档都直接按输出尺寸生成（需为 8 的倍数），不再先生成模型原生分辨率再缩小
+PROFILES = {
+    'draft': {'steps': 6, 'width': OUTPUT_SIZE[0], 'height': OUTPUT_SIZE[1]},
+    'full': {'steps': 20, 'width': OUTPUT_SIZE[0], 'height': OUTPUT_SIZE[1]},
+}
+
+
+def load_pipeline(model_id=MODEL_ID, device="cuda"):
+    # 与 stablediffusion.ipynb 相同的模型和调度器
+    import torch
+    from diffusers import StableDiffusionPipeline, EulerDiscreteScheduler
+
+    dtype = torch.float16 if device == "cuda" else torch.float32
+    pipe = StableDiffusionPipeline.from_pretrained(model_id, torch_dtype=dtype)
+    pipe.scheduler = EulerDiscreteScheduler.from_config(pipe.scheduler.config)
+    return pipe.to(device)
+
+
+def seed_generator(device):
+    # 每个请求使用自己的生成器，批量推理时同一种子得到与单独生成相同的结果
+    try:
+        import torch
+    except ImportError:
+        return lambda seed: seed
+    return lambda seed: torch.Generator(device=device).manual_seed(seed)
+
+
+def encode_png(image, size=OUTPUT_SIZE):
+    # 尺寸不同时缩放到输出尺寸，再编码为 PNG 字节；JSON 接口在响应时才转 base64
+    if image.size != size:
+        image = image.resize(size, Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+class PipelineRenderer:
+    """MicroBatcher 的 render 函数：一批请求调用一次管线"""
+
+    def __init__(self, pipe, device="cuda"):
+        self.pipe = pipe
+        self.make_generator = seed_generator(device)
+
+    def __call__(self, batch):
+        first = batch[0]
+        images = self.pipe(
+            prompt=[r.prompt for r in batch],
+            negative_prompt=[r.negative_prompt or NEGATIVE_PROMPT for r in batch],
+            num_inference_steps=first.steps,
+            guidance_scale=first.guidance_scale,
+            width=first.width,
+            height=first.height,
+            generator=[self.make_generator(r.seed) for r in batch]
+        ).images
+        return [encode_png(image) for image in images]
+
+
+class FakePipelineOutput:
+    def __init__(self, images):
+        self.images = images
+
+
+class FakePipeline:
+    """接口与 StableDiffusionPipeline 相同的假管线，按提示词和种子生成纯色图，用于 CPU 上测试调度"""
+
+    def __init__(self, step_seconds=0.01, batch_overhead=0.1, size=512):
+        # 耗时 = 固定开销 + 步数 × 每步耗时，与批大小无关，模拟 GPU 批量推理的收益
+        self.step_seconds = step_seconds
+        self.batch_overhead = batch_overhead
+        self.size = size
+        self.calls = 0
+
+    def __call__(self, prompt, negative_prompt=None, num_inference_steps=20, guidance_scale=7.0,
+                 width=None, height=None, generator=None):
+        self.calls += 1
+        prompts = prompt if isinstance(prompt, list) else [prompt]
+        generators = generator if isinstance(generator, list) else [generator] * len(prompts)
+        time.sleep(self.batch_overhead + num_inference_steps * self.step_seconds)
+        size = (width or self.size, height or self.size)
+        images = []
+        for text, g in zip(prompts, generators):
+            seed = g.initial_seed() if hasattr(g, 'initial_seed') else g
+            digest = hashlib.sha256(f"{text}\x00{seed}\x00{num_inference_steps}".encode('utf-8')).digest()
+            images.append(Image.new('RGB', size, tuple(digest[:3])))
+        return FakePipelineOutput(images)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Stable Diffusion 服务，接口与 stablediffusion.ipynb 中的 Flask 服务兼容（GET /hello、POST /image）
+# 并发请求经 MicroBatcher 合并成批量推理，完全相同的请求只生成一次
+# GPU 上：python -m sd_server.server --port 5005
+# 无 GPU 测试：python -m sd_server.server --fake --port 5005
+import base64
+import argparse
+
+from flask import Flask, request, jsonify, Response
+from flask_cors import CORS
+
+from sd_server.batcher import MicroBatcher
+from sd_server.pipeline import MODEL_ID, PROFILES, FakePipeline, PipelineRenderer, load_pipeline
+
+
+def parse_request(data):
+    # 校验并转换请求参数，返回传给 MicroBatcher.submit 的关键字参数；参数无效时抛出 ValueError
+    # profile 选择生成档位（draft / full，默认 full），请求中显式给出的 steps、width、height 优先
+    profile = PROFILES.get(data.get("profile") or 'full')
+    if profile is None:
+        raise ValueError(f"Unknown profile, expected one of {sorted(PROFILES)}")
+    prompt = data.get("prompt")
+    if not isinstance(prompt, str) or not prompt.strip():
+        raise ValueError("prompt must be a non-empty string")
+    negative_prompt = data.get("negative_prompt")
+    if negative_prompt is not None and not isinstance(negative_prompt, str):
+        raise ValueError("negative_prompt must be a string")
+    try:
+        # 种子和引导系数的默认值与原来的服务一致：固定种子 42、引导系数 7
+        params = {
+            "width": int(data.get("width", profile['width'])),
+            "height": int(data.get("height", profile['height'])),
+            "seed": int(data.get("seed", 42)),
+            "steps": int(data.get("steps", profile['steps'])),
+            "guidance_scale": float(data.get("guidance_scale", 7)),
+        }
+    except (TypeError, ValueError):
+        raise ValueError("width, height, seed and steps must be integers, guidance_scale a number")
+    if params["width"] <= 0 or params["height"] <= 0 or params["width"] % 8 or params["height"] % 8:
+        raise ValueError("width and height must be positive multiples of 8")
+    if params["steps"] <= 0:
+        raise ValueError("steps must be positive")
+    return dict(params, prompt=prompt, negative_prompt=negative_prompt)
+
+
+def create_app(batcher, timeout=300.0):
+    app = Flask(__name__)
+    CORS(app)  # 允许所有路由的 CORS
+
+    @app.route('/hello', methods=['GET'])
+    def hello():
+        return "helloworld!"
+
+    @app.route('/image', methods=['POST'])
+    def get_image():
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data, dict):
+            return jsonify({"error": "No data provided"}), 400
+        try:
+            params = parse_request(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        try:
+            future = batcher.submit(**params)
+            png = future.result(timeout=timeout)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+        # Accept 优先 image/png 时直接返回 PNG 字节，省去 base64 编码和 JSON 解析；否则保持原来的 JSON 格式
+        if request.accept_mimetypes.best_match(['application/json', 'image/png']) == 'image/png':
+            return Response(png, mimetype='image/png')
+        img_base64 = base64.b64encode(png).decode('utf-8')
+        return jsonify({
+            "status": "success",
+            "message": "Data received successfully",
+            "respond": {
+                "img_base64": img_base64
+            }
+        }), 200
+
+    @app.route('/stats', methods=['GET'])
+    def stats():
+        return jsonify(batcher.stats())
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5005)
+    parser.add_argument('--model', default=MODEL_ID)
+    parser.add_argument('--device', default='cuda')
+    parser.add_argument('--max-batch-size', type=int, default=4)
+    parser.add_argument('--max-wait', type=float, default=0.05, help='凑批的最长等待时间（秒）')
+    parser.add_argument('--fake', action='store_true', help='使用假管线，不加载模型')
+    args = parser.parse_args()
+
+    if args.fake:
+        renderer = PipelineRenderer(FakePipeline(), device='cpu')
+    else:
+        renderer = PipelineRenderer(load_pipeline(args.model, args.device), device=args.device)
+    batcher = MicroBatcher(renderer, max_batch_size=args.max_batch_size, max_wait=args.max_wait)
+    # 多线程接收请求，推理由批处理线程串行执行
+    create_app(batcher).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
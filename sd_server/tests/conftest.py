@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+# sd_server 按包导入（python -m sd_server.server），测试从仓库根目录导入
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
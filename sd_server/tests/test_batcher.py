@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# MicroBatcher：在 CPU 上用假管线检查凑批、超时发车、错误传播和不同参数不合批
+import time
+import threading
+
+import pytest
+
+from sd_server.batcher import MicroBatcher
+from sd_server.pipeline import FakePipeline, PipelineRenderer
+
+
+class RecordingRenderer:
+    """记录每批请求的提示词，可以在一批开始前挡住批处理线程"""
+
+    def __init__(self, pipe=None, fail_on=None):
+        self.renderer = PipelineRenderer(pipe or FakePipeline(step_seconds=0, batch_overhead=0.01), device='cpu')
+        self.batches = []
+        self.fail_on = fail_on
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+
+    def __call__(self, batch):
+        self.started.set()
+        self.gate.wait(5)
+        self.batches.append([r.prompt for r in batch])
+        if self.fail_on and any(r.prompt == self.fail_on for r in batch):
+            raise RuntimeError('out of memory')
+        return self.renderer(batch)
+
+
+def block_first_batch(batcher, render):
+    # 先提交一个请求占住批处理线程，之后提交的请求都在队列里等，放行后按批次取走
+    render.gate.clear()
+    max_wait, batcher.max_wait = batcher.max_wait, 0
+    blocker = batcher.submit('blocker')
+    assert render.started.wait(5)
+    batcher.max_wait = max_wait
+    return blocker
+
+
+def test_coalesces_up_to_batch_size():
+    render = RecordingRenderer()
+    batcher = MicroBatcher(render, max_batch_size=4, max_wait=5)
+    blocker = block_first_batch(batcher, render)
+    futures = [batcher.submit(f'prompt {i}') for i in range(6)]
+    render.gate.set()
+
+    start = time.monotonic()
+    for future in [blocker] + futures[:4]:
+        future.result(5)
+    # 凑满 max_batch_size 立即发车，不等 max_wait
+    assert time.monotonic() - start < 2
+    assert render.batches[1] == [f'prompt {i}' for i in range(4)]
+    # 剩下两个不满一批，等到 max_wait 才发车，这里不等它们
+
+
+def test_identical_requests_share_one_generation():
+    render = RecordingRenderer()
+    batcher = MicroBatcher(render, max_batch_size=4, max_wait=0.05)
+    blocker = block_first_batch(batcher, render)
+    futures = [batcher.submit('same prompt', seed=7) for _ in range(3)]
+    render.gate.set()
+    blocker.result(5)
+    assert len({id(f) for f in futures}) == 1
+    futures[0].result(5)
+    assert render.batches[1] == ['same prompt']
+    assert batcher.stats()['coalesced'] == 2
+
+
+def test_partial_batch_flushes_after_max_wait():
+    render = RecordingRenderer()
+    batcher = MicroBatcher(render, max_batch_size=8, max_wait=0.2)
+    start = time.monotonic()
+    futures = [batcher.submit('a'), batcher.submit('b')]
+    for future in futures:
+        assert future.result(5).startswith(b'\x89PNG')
+    elapsed = time.monotonic() - start
+    assert 0.2 <= elapsed < 2
+    assert render.batches == [['a', 'b']]
+
+
+def test_error_reaches_every_waiter_in_batch():
+    render = RecordingRenderer(fail_on='bad')
+    batcher = MicroBatcher(render, max_batch_size=4, max_wait=0.05)
+    blocker = block_first_batch(batcher, render)
+    failed = [batcher.submit('bad'), batcher.submit('good'), batcher.submit('bad')]
+    render.gate.set()
+    blocker.result(5)
+    for future in failed:
+        with pytest.raises(RuntimeError, match='out of memory'):
+            future.result(5)
+    assert render.batches[1] == ['bad', 'good']
+    assert batcher.stats()['errors'] == 1
+
+    # 出错后批处理线程继续工作
+    assert batcher.submit('after').result(5).startswith(b'\x89PNG')
+
+
+def test_mixed_shapes_are_not_batched_together():
+    render = RecordingRenderer()
+    batcher = MicroBatcher(render, max_batch_size=4, max_wait=0.05)
+    blocker = block_first_batch(batcher, render)
+    futures = [
+        batcher.submit('square 1', width=400, height=400),
+        batcher.submit('wide', width=640, height=384),
+        batcher.submit('square 2', width=400, height=400),
+        batcher.submit('draft', width=400, height=400, steps=6),
+    ]
+    render.gate.set()
+    blocker.result(5)
+    for future in futures:
+        future.result(5)
+    assert sorted(render.batches[1:]) == [['draft'], ['square 1', 'square 2'], ['wide']]
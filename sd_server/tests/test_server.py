@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# /image 参数校验：无效参数返回 400，不进入推理
+import pytest
+
+from sd_server.batcher import MicroBatcher
+from sd_server.pipeline import FakePipeline, PipelineRenderer
+from sd_server.server import create_app
+
+
+@pytest.fixture
+def client():
+    renderer = PipelineRenderer(FakePipeline(step_seconds=0, batch_overhead=0), device='cpu')
+    batcher = MicroBatcher(renderer, max_batch_size=2, max_wait=0.01)
+    app = create_app(batcher, timeout=5)
+    return app.test_client()
+
+
+@pytest.mark.parametrize('payload', [
+    {'steps': 6},
+    {'prompt': None},
+    {'prompt': '   '},
+    {'prompt': 123},
+    {'prompt': 'x', 'width': 'wide'},
+    {'prompt': 'x', 'height': None},
+    {'prompt': 'x', 'seed': 'abc'},
+    {'prompt': 'x', 'steps': [6]},
+    {'prompt': 'x', 'steps': 0},
+    {'prompt': 'x', 'guidance_scale': 'high'},
+    {'prompt': 'x', 'width': 401},
+    {'prompt': 'x', 'width': -8},
+    {'prompt': 'x', 'negative_prompt': ['a']},
+    {'prompt': 'x', 'profile': 'ultra'},
+])
+def test_invalid_request_returns_400(client, payload):
+    response = client.post('/image', json=payload)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_non_object_body_returns_400(client):
+    assert client.post('/image', json=['prompt']).status_code == 400
+    assert client.post('/image', data='not json', content_type='application/json').status_code == 400
+
+
+def test_valid_request_returns_png(client):
+    response = client.post('/image', json={'prompt': 'glacier', 'profile': 'draft'},
+                           headers={'Accept': 'image/png'})
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    response = client.post('/image', json={'prompt': 'glacier', 'seed': '7', 'guidance_scale': '6.5'})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'success'